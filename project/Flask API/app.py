@@ -2,80 +2,312 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, make_response, stream_with_context
 from flask_cors import CORS
+from functools import wraps
+from datetime import date
 import os
 import pandas as pd
 from config import Config
 from utils.data_processor import DataProcessor # pyright: ignore[reportMissingImports]
 from utils.analytics import AnalyticsEngine # pyright: ignore[reportMissingImports]
+from utils.cache import ResponseCache # pyright: ignore[reportMissingImports]
+from utils.concurrency import SectionExecutor # pyright: ignore[reportMissingImports]
+from utils.serialization import FastJSONProvider # pyright: ignore[reportMissingImports]
+from utils.export import EXPORT_FORMATS, export_chunks, frame_to_records, gzip_chunks # pyright: ignore[reportMissingImports]
+from utils.storage import open_storage # pyright: ignore[reportMissingImports]
+from utils.snapshot import SourceChangedError # pyright: ignore[reportMissingImports]
+from utils.anomaly import AnomalyDetector # pyright: ignore[reportMissingImports]
+from utils import metrics # pyright: ignore[reportMissingImports]
+from utils.profiler import SlowRequestProfiler # pyright: ignore[reportMissingImports]
+import time
+import hmac
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.config.from_object(Config)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Initialize data processor
-data_processor = DataProcessor(app.config['DATA_FILE_PATH'])
+data_processor = DataProcessor(
+    app.config['DATA_FILE_PATH'],
+    compact=app.config['COMPACT_DATA'],
+    chunk_size=app.config['DATA_CHUNK_SIZE'],
+    snapshot=app.config['DATA_SNAPSHOT'],
+    memory_map=app.config['DATA_MEMORY_MAP'],
+    shards=app.config['DATA_SHARDS'],
+    shard_by=app.config['DATA_SHARD_BY'],
+    storage=open_storage(app.config['DATA_STORAGE'], app.config['DATA_STORAGE_PATH']) if app.config['DATA_STORAGE'] else None,
+    detector=AnomalyDetector(
+        baseline=app.config['ALERT_BASELINE_RATINGS'],
+        recent=app.config['ALERT_RECENT_RATINGS'],
+        threshold=app.config['ALERT_THRESHOLD'],
+        min_ratings=app.config['ALERT_MIN_RATINGS']
+    )
+)
 analytics_engine = AnalyticsEngine(data_processor)
+if app.config['DATA_WATCH_INTERVAL']:
+    data_processor.watch(app.config['DATA_WATCH_INTERVAL'])
+
+@app.before_request
+def pin_dataset():
+    """Serve the whole request from one dataset version, even if a reload swaps it"""
+    data_processor.pin()
+
+@app.teardown_request
+def unpin_dataset(error=None):
+    data_processor.unpin()
+
+# ========== INSTRUMENTATION ==========
+
+request_seconds = metrics.registry.histogram(
+    'campus_pulse_request_duration_seconds', 'Time to handle a request, until its body starts streaming',
+    ['endpoint', 'method', 'status']
+)
+metrics.registry.gauge('campus_pulse_dataset_rows', 'Rows in the served dataset', lambda: data_processor.num_rows)
+metrics.registry.gauge('campus_pulse_dataset_version', 'Version of the served dataset', lambda: data_processor.version)
+metrics.registry.gauge('campus_pulse_active_alerts', 'Facilities and majors with a satisfaction drop alert', lambda: len(data_processor.get_alerts()))
+
+profiler = SlowRequestProfiler(
+    app.config['PROFILE_SLOW_REQUESTS'],
+    interval=app.config['PROFILE_INTERVAL'],
+    directory=app.config['PROFILE_DIR']
+) if app.config['PROFILE_SLOW_REQUESTS'] is not None else None
+
+@app.before_request
+def start_timing():
+    metrics.begin_request()
+    if profiler is not None:
+        profiler.start()
+
+@app.after_request
+def record_timing(response):
+    """Report the request's section timings in a Server-Timing header and the latency histogram"""
+    timings = metrics.current_timings()
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings.started
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = timings.server_timing(total)
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_seconds.observe(total, endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+def bind_request(func):
+    """Wrap func to run in another thread against this request's dataset version, timings and profile"""
+    func = metrics.bind(data_processor.bind(func))
+    return profiler.bind(func) if profiler is not None else func
+
+@app.teardown_request
+def stop_timing(error=None):
+    timings = metrics.end_request()
+    if profiler is not None and timings is not None:
+        profiler.stop(f'{request.method} {request.full_path.rstrip("?")}', time.perf_counter() - timings.started)
+
+# ========== RESPONSE CACHE ==========
+
+response_cache = ResponseCache(
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['CACHE_MAX_BYTES'],
+    timeout=app.config['CACHE_DEFAULT_TIMEOUT']
+) if app.config['CACHE_TYPE'] != 'NullCache' else None
+
+if response_cache is not None:
+    metrics.registry.counter_func('campus_pulse_response_cache_hits_total', 'Responses served from the cache', lambda: response_cache.hits)
+    metrics.registry.counter_func('campus_pulse_response_cache_misses_total', 'Cacheable responses that had to be computed', lambda: response_cache.misses)
+    metrics.registry.gauge(
+        'campus_pulse_response_cache_hit_ratio', 'Share of cache lookups that were hits',
+        lambda: response_cache.hits / max(response_cache.hits + response_cache.misses, 1)
+    )
+    metrics.registry.gauge('campus_pulse_response_cache_entries', 'Responses held in the cache', lambda: len(response_cache))
+    metrics.registry.gauge('campus_pulse_response_cache_bytes', 'Size of the cached response bodies', lambda: response_cache.size)
+
+# Filter values match case-insensitively, so they share cache entries
+CASE_INSENSITIVE_ARGS = {'facility', 'year', 'major'}
+
+def cache_key():
+    """Endpoint, normalized query arguments and dataset version of the current request"""
+    args = []
+    for name, value in request.args.items(multi=True):
+        value = value.strip()
+        if not value:
+            continue
+        args.append((name, value.lower() if name in CASE_INSENSITIVE_ARGS else value))
+    return request.path, tuple(sorted(args)), data_processor.version
+
+def cached(view):
+    """Serve a GET endpoint from the response cache, answering 304 when the client's ETag matches"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if response_cache is None:
+            return view(*args, **kwargs)
+
+        key = cache_key()
+        entry = response_cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed or 'no-store' in response.headers.get('Cache-Control', ''):
+                return response
+            entry = response_cache.put(key, response.get_data(), response.mimetype)
+
+        response = app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        minimum = app.config['COMPRESS_MIN_BYTES']
+        if minimum is not None and len(entry.body) >= minimum and request.accept_encodings['gzip']:
+            # Each encoding is a different representation, so it gets its own ETag
+            response.set_data(entry.gzipped())
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(entry.etag + '-gzip')
+        response.vary.add('Accept-Encoding')
+        # Let browsers keep the body but revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+# ========== RESPONSE SHAPE ==========
+
+def wants_columnar():
+    """Whether the client asked for chart-ready columns (shape=columnar) instead of rows"""
+    return request.args.get('shape') == 'columnar'
+
+def group_count(metrics):
+    """Number of groups in rows or columnar metrics"""
+    if isinstance(metrics, dict) and 'labels' in metrics:
+        return len(metrics['labels'])
+    return len(metrics)
+
+# ========== SUMMARY SECTIONS ==========
+
+section_executor = SectionExecutor(
+    max_workers=app.config['SUMMARY_WORKERS'],
+    timeout=app.config['SUMMARY_SECTION_TIMEOUT']
+) if app.config['SUMMARY_WORKERS'] else None
+
+def empty_sections(columnar):
+    """Values served for summary sections with nothing to show"""
+    return {
+        'overall': {},
+        'facilities': data_processor.empty_columns('facility') if columnar else [],
+        'years': data_processor.empty_columns('academic_year') if columnar else [],
+        'majors': data_processor.empty_columns('major') if columnar else [],
+        'time_analysis': data_processor.empty_columns('time_of_day') if columnar else {},
+        'trends': {},
+        'insights': []
+    }
+
+def summarize(filters=None):
+    """The aggregation pass the summary sections share, run in the section executor under its timeout"""
+    if section_executor is None:
+        return data_processor.summarize(filters)
+    return section_executor.call(bind_request(lambda: data_processor.summarize(filters)))
+
+def unavailable_response(columnar, error):
+    """Every section served empty because the aggregation pass they share failed or timed out"""
+    print(f"Summary unavailable: {type(error).__name__}: {error}")
+    data = empty_sections(columnar)
+    return sections_response(data, list(data))
+
+def summary_response(sections, columnar):
+    """Compute {name: callable} summary sections, concurrently when a section executor is configured
+
+    Sections that fail or time out are served empty and listed under
+    incomplete_sections, and the partial response is not cached.
+    """
+    if section_executor is None:
+        data, incomplete = {name: section() for name, section in sections.items()}, []
+    else:
+        # Worker threads must read the same dataset version as this request
+        data, incomplete = section_executor.run(
+            {name: bind_request(section) for name, section in sections.items()},
+            fallbacks=empty_sections(columnar)
+        )
+    return sections_response(data, incomplete)
+
+def sections_response(data, incomplete):
+    """JSON response for computed sections, not cached when some are missing"""
+    data['overall']['facilities_count'] = group_count(data['facilities'])
+    payload = {
+        'success': True,
+        'data': data
+    }
+    if not incomplete:
+        return jsonify(payload)
+
+    payload['incomplete_sections'] = incomplete
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 # ========== ROUTES ==========
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Latency histograms, cache hit rates, rows scanned and dataset load time in Prometheus text format"""
+    return app.response_class(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     """Main dashboard page"""
     return render_template('index.html')
 
 @app.route('/api/overall-metrics')
+@cached
 def get_overall_metrics():
     """Get overall metrics"""
     metrics = data_processor.get_overall_metrics()
     return jsonify({
         'success': True,
         'data': metrics,
-        'timestamp': pd.Timestamp.now().isoformat()
+        # Cached per dataset version, so this is when that version was loaded rather than now
+        'timestamp': data_processor.updated_at.isoformat()
     })
 
 @app.route('/api/facility-metrics')
+@cached
 def get_facility_metrics():
     """Get facility-wise metrics"""
-    facilities = data_processor.get_facility_metrics()
+    facilities = data_processor.get_facility_metrics(columnar=wants_columnar())
     return jsonify({
         'success': True,
         'data': facilities,
-        'count': len(facilities)
+        'count': group_count(facilities)
     })
 
 @app.route('/api/year-metrics')
+@cached
 def get_year_metrics():
     """Get year-wise metrics"""
-    years = data_processor.get_year_metrics()
+    years = data_processor.get_year_metrics(columnar=wants_columnar())
     return jsonify({
         'success': True,
         'data': years,
-        'count': len(years)
+        'count': group_count(years)
     })
 
 @app.route('/api/major-metrics')
+@cached
 def get_major_metrics():
     """Get major-wise metrics"""
-    majors = data_processor.get_major_metrics()
+    majors = data_processor.get_major_metrics(columnar=wants_columnar())
     return jsonify({
         'success': True,
         'data': majors,
-        'count': len(majors)
+        'count': group_count(majors)
     })
 
 @app.route('/api/time-metrics')
+@cached
 def get_time_metrics():
     """Get time-based metrics"""
-    time_data = data_processor.get_time_metrics()
+    time_data = data_processor.get_time_metrics(columnar=wants_columnar())
     return jsonify({
         'success': True,
         'data': time_data
     })
 
 @app.route('/api/trend-analysis')
+@cached
 def get_trend_analysis():
     """Get trend analysis"""
     trend_data = analytics_engine.get_trend_analysis()
@@ -85,6 +317,7 @@ def get_trend_analysis():
     })
 
 @app.route('/api/insights')
+@cached
 def get_insights():
     """Get actionable insights"""
     insights = analytics_engine.get_insights()
@@ -94,29 +327,203 @@ def get_insights():
         'count': len(insights)
     })
 
+@app.route('/api/alerts')
+@cached
+def get_alerts():
+    """Get facilities and majors whose recent satisfaction dropped well below their usual level"""
+    try:
+        alerts = data_processor.get_alerts(request.args.get('dimension'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameters',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'data': alerts,
+        'count': len(alerts)
+    })
+
 @app.route('/api/filtered-data')
+@cached
 def get_filtered_data():
-    """Get filtered data based on query parameters"""
+    """Get filtered data based on query parameters
+
+    Returns one page of rows as JSON by default, or streams every matching row
+    with format=ndjson or format=csv. fields= picks the columns, and limit plus
+    offset or cursor picks the page.
+    """
     filters = {
         'facility': request.args.get('facility'),
         'year': request.args.get('year'),
         'major': request.args.get('major'),
         'score_range': request.args.get('score_range')
     }
+    output_format = request.args.get('format', 'json')
     
-    filtered_data = data_processor.get_filtered_data(filters)
+    try:
+        if output_format not in ('json', 'ndjson', 'csv'):
+            raise ValueError("format must be json, ndjson or csv")
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()] or None
+        offset = int(request.args.get('offset', 0))
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if offset < 0:
+            raise ValueError("offset must be 0 or more")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be 1 or more")
+        if output_format == 'json':
+            # JSON responses are built in memory, so they are always paged
+            limit = min(limit if limit is not None else app.config['PAGE_SIZE'], app.config['MAX_PAGE_SIZE'])
+
+        page, total, next_cursor = data_processor.select_page(filters, offset, limit, cursor)
+        frames = data_processor.iter_filtered_frames(page, fields, app.config['STREAM_CHUNK_SIZE'])
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameters',
+            'message': str(e)
+        }), 400
+    except SourceChangedError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Dataset reloading',
+            'message': str(e)
+        }), 503
+
+    if output_format != 'json':
+        mimetype, _ = EXPORT_FORMATS[output_format]
+        return app.response_class(
+            stream_with_context(export_chunks(frames, output_format)),
+            mimetype=mimetype,
+            headers={'X-Total-Count': str(total)}
+        )
+
+    with metrics.timed('records'):
+        filtered_data = [record for frame in frames for record in frame_to_records(frame)]
     return jsonify({
         'success': True,
         'data': filtered_data,
-        'count': len(filtered_data),
+        'count': total,
+        'returned': len(filtered_data),
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': next_cursor,
         'filters_applied': filters
     })
 
+@app.route('/api/export')
+def export_data():
+    """Download the rows matching the filters as a CSV, NDJSON or (with pyarrow) Parquet file
+
+    The file is streamed in chunks straight from the loaded columns and
+    gzipped on the fly when the client accepts it.
+    """
+    filters = {
+        'facility': request.args.get('facility'),
+        'year': request.args.get('year'),
+        'major': request.args.get('major'),
+        'score_range': request.args.get('score_range')
+    }
+    output_format = request.args.get('format', 'csv')
+
+    try:
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()] or None
+        page, total, _ = data_processor.select_page(filters)
+        frames = data_processor.iter_filtered_frames(page, fields, app.config['STREAM_CHUNK_SIZE'])
+        chunks = export_chunks(frames, output_format)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameters',
+            'message': str(e)
+        }), 400
+    except SourceChangedError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Dataset reloading',
+            'message': str(e)
+        }), 503
+
+    mimetype, extension = EXPORT_FORMATS[output_format]
+    filename = f"campus_pulse_data_{date.today().isoformat()}.{extension}"
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Total-Count': str(total),
+        'Vary': 'Accept-Encoding'
+    }
+    # Parquet pages are compressed already
+    if output_format != 'parquet' and request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return app.response_class(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@app.route('/api/score-percentiles')
+@cached
+def get_score_percentiles():
+    """Get exact score median, quartiles and percentiles per facility, year or major"""
+    filters = {
+        'facility': request.args.get('facility'),
+        'year': request.args.get('year'),
+        'major': request.args.get('major'),
+        'score_range': request.args.get('score_range')
+    }
+    by = request.args.get('by', 'facility')
+    try:
+        percentiles = [float(p) for p in request.args.get('percentiles', '10,25,50,75,90').split(',') if p.strip()]
+        groups = data_processor.get_score_percentiles(by, percentiles, filters)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameters',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'data': groups,
+        'count': len(groups)
+    })
+
+@app.route('/api/trends')
+@cached
+def get_trends():
+    """Get mean scores per day, week, month or semester, overall or per facility, year or major"""
+    filters = {
+        'facility': request.args.get('facility'),
+        'year': request.args.get('year'),
+        'major': request.args.get('major'),
+        'score_range': request.args.get('score_range')
+    }
+    try:
+        window = int(request.args['window']) if request.args.get('window') else None
+        trends = data_processor.get_trends(
+            request.args.get('granularity', 'month'), request.args.get('by'), window, filters
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameters',
+            'message': str(e)
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'data': trends,
+        'count': len(trends['labels'])
+    })
+
 @app.route('/api/facilities')
+@cached
 def get_facilities():
     """Get list of all facilities"""
-    if data_processor.df is not None and 'facility_rated' in data_processor.df.columns:
-        facilities = sorted([str(f) for f in data_processor.df['facility_rated'].unique().tolist()])
+    if data_processor.has_column('facility_rated'):
+        facilities = data_processor.get_distinct_values('facility_rated')
         return jsonify({
             'success': True,
             'data': facilities
@@ -124,10 +531,11 @@ def get_facilities():
     return jsonify({'success': False, 'data': []})
 
 @app.route('/api/years')
+@cached
 def get_years():
     """Get list of all academic years"""
-    if data_processor.df is not None and 'academic_year' in data_processor.df.columns:
-        years = sorted(data_processor.df['academic_year'].unique().tolist())
+    if data_processor.has_column('academic_year'):
+        years = data_processor.get_distinct_values('academic_year')
         return jsonify({
             'success': True,
             'data': years
@@ -135,10 +543,11 @@ def get_years():
     return jsonify({'success': False, 'data': []})
 
 @app.route('/api/majors')
+@cached
 def get_majors():
     """Get list of all majors"""
-    if data_processor.df is not None and 'major' in data_processor.df.columns:
-        majors = sorted(data_processor.df['major'].unique().tolist())
+    if data_processor.has_column('major'):
+        majors = data_processor.get_distinct_values('major')
         return jsonify({
             'success': True,
             'data': majors
@@ -146,26 +555,28 @@ def get_majors():
     return jsonify({'success': False, 'data': []})
 
 @app.route('/api/dashboard-summary')
+@cached
 def get_dashboard_summary():
     """Get complete dashboard summary"""
-    facilities = data_processor.get_facility_metrics()
-    overall = data_processor.get_overall_metrics()
-    overall['facilities_count'] = len(facilities)
-
-    return jsonify({
-        'success': True,
-        'data': {
-            'overall': overall,
-            'facilities': facilities,
-            'years': data_processor.get_year_metrics(),
-            'majors': data_processor.get_major_metrics(),
-            'time_analysis': data_processor.get_time_metrics(),
-            'trends': analytics_engine.get_trend_analysis(),
-            'insights': analytics_engine.get_insights()
-        }
-    })
+    columnar = wants_columnar()
+    # Every section is read from one aggregation pass
+    try:
+        summary = summarize()
+    except Exception as e:
+        return unavailable_response(columnar, e)
+
+    return summary_response({
+        'overall': lambda: data_processor.get_overall_metrics(summary=summary),
+        'facilities': lambda: data_processor.get_facility_metrics(summary=summary, columnar=columnar),
+        'years': lambda: data_processor.get_year_metrics(summary=summary, columnar=columnar),
+        'majors': lambda: data_processor.get_major_metrics(summary=summary, columnar=columnar),
+        'time_analysis': lambda: data_processor.get_time_metrics(summary=summary, columnar=columnar),
+        'trends': lambda: analytics_engine.get_trend_analysis(summary=summary),
+        'insights': lambda: analytics_engine.get_insights(summary=summary)
+    }, columnar)
 
 @app.route('/api/filtered-dashboard-summary')
+@cached
 def get_filtered_dashboard_summary():
     """Get dashboard summary based on filters"""
     filters = {
@@ -174,63 +585,131 @@ def get_filtered_dashboard_summary():
         'major': request.args.get('major'),
         'score_range': request.args.get('score_range')
     }
-
-    # Get filtered data
-    filtered_data = data_processor.get_filtered_data(filters)
-
-    if not filtered_data:
+    columnar = wants_columnar()
+
+    try:
+        summary = summarize(filters)
+    except Exception as e:
+        return unavailable_response(columnar, e)
+    if summary is not None:
+        # One aggregation pass over the matching cells or rows answers every section
+        filtered_count = summary.totals['rows']
+    else:
+        # Work on the loaded rows through a mask, keeping their dtypes
+        filtered_df = data_processor.get_filtered_frame(filters)
+        filtered_count = len(filtered_df)
+
+    if not filtered_count:
+        data = empty_sections(columnar)
+        data['overall'] = {'total_ratings': 0, 'average_score': 0, 'score_distribution': {}, 'category_distribution': {}}
+        data['trends'] = []
         return jsonify({
             'success': True,
-            'data': {
-                'overall': {'total_ratings': 0, 'average_score': 0, 'score_distribution': {}, 'category_distribution': {}},
-                'facilities': [],
-                'years': [],
-                'majors': [],
-                'time_analysis': {},
-                'trends': [],
-                'insights': []
-            }
+            'data': data
         })
 
-    # Create a temporary dataframe from filtered data for calculations
-    filtered_df = pd.DataFrame(filtered_data)
-
-    # Calculate filtered metrics
-    overall_metrics = data_processor.calculate_overall_metrics_from_df(filtered_df)
-    facility_metrics = data_processor.calculate_facility_metrics_from_df(filtered_df)
-    year_metrics = data_processor.calculate_year_metrics_from_df(filtered_df)
-    major_metrics = data_processor.calculate_major_metrics_from_df(filtered_df)
-    time_metrics = data_processor.calculate_time_metrics_from_df(filtered_df)
-
-    # Add facilities_count to overall metrics
-    overall_metrics['facilities_count'] = len(facility_metrics)
+    if summary is not None:
+        # Trends and insights need enough data to be meaningful
+        try:
+            analysis = summary if filtered_count > 10 else summarize()
+        except Exception as e:
+            return unavailable_response(columnar, e)
+        return summary_response({
+            'overall': lambda: data_processor.get_overall_metrics(summary=summary),
+            'facilities': lambda: data_processor.get_facility_metrics(summary=summary, columnar=columnar),
+            'years': lambda: data_processor.get_year_metrics(summary=summary, columnar=columnar),
+            'majors': lambda: data_processor.get_major_metrics(summary=summary, columnar=columnar),
+            'time_analysis': lambda: data_processor.get_time_metrics(summary=summary, columnar=columnar),
+            'trends': lambda: analytics_engine.get_trend_analysis(summary=analysis),
+            'insights': lambda: analytics_engine.get_insights(summary=analysis)
+        }, columnar)
 
     # For trends and insights, use filtered data for more accurate analysis
     # Create filtered analytics engine if there's enough data
     if len(filtered_df) > 10:  # Only if we have meaningful data
-        # Create a temporary data processor with filtered data
-        temp_processor = DataProcessor.__new__(DataProcessor)
-        temp_processor.df = filtered_df
-        filtered_analytics = AnalyticsEngine(temp_processor)
-        trends = filtered_analytics.get_trend_analysis()
-        insights = filtered_analytics.get_insights()
+        analysis_engine = AnalyticsEngine(data_processor, df=filtered_df)
     else:
         # Fall back to full dataset trends if filtered data is too small
-        trends = analytics_engine.get_trend_analysis()
-        insights = analytics_engine.get_insights()
+        analysis_engine = analytics_engine
+
+    # Calculate filtered metrics
+    return summary_response({
+        'overall': lambda: data_processor.calculate_overall_metrics_from_df(filtered_df),
+        'facilities': lambda: data_processor.calculate_facility_metrics_from_df(filtered_df, columnar),
+        'years': lambda: data_processor.calculate_year_metrics_from_df(filtered_df, columnar),
+        'majors': lambda: data_processor.calculate_major_metrics_from_df(filtered_df, columnar),
+        'time_analysis': lambda: data_processor.calculate_time_metrics_from_df(filtered_df, columnar),
+        'trends': analysis_engine.get_trend_analysis,
+        'insights': analysis_engine.get_insights
+    }, columnar)
+
+@app.route('/api/ratings', methods=['POST'])
+def add_ratings():
+    """Append one rating, a list of ratings or {"ratings": [...]} to the dataset"""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'ratings' in payload:
+        payload = payload['ratings']
+    if payload is None:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid rating',
+            'message': 'Request body must be JSON'
+        }), 400
+
+    try:
+        appended, total = data_processor.append(payload)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid rating',
+            'message': str(e)
+        }), 400
 
     return jsonify({
         'success': True,
-        'data': {
-            'overall': overall_metrics,
-            'facilities': facility_metrics,
-            'years': year_metrics,
-            'majors': major_metrics,
-            'time_analysis': time_metrics,
-            'trends': trends,
-            'insights': insights
-        }
-    })
+        'count': appended,
+        'total_ratings': total
+    }), 201
+
+# ========== ADMIN ==========
+
+def admin_required(func):
+    """Answer only requests bearing ADMIN_TOKEN; with no token configured the endpoint is off"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if not token:
+            return jsonify({
+                'success': False,
+                'error': 'Resource not found',
+                'message': 'Admin endpoints are disabled'
+            }), 404
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.strip().encode(), token.encode()):
+            return jsonify({
+                'success': False,
+                'error': 'Unauthorized',
+                'message': 'A valid admin token is required'
+            }), 401, {'WWW-Authenticate': 'Bearer'}
+        return func(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/reload', methods=['POST'])
+@admin_required
+def reload_data():
+    """Reload the data file in the background and swap it in when ready"""
+    if not data_processor.reload(background=True):
+        return jsonify({
+            'success': False,
+            'error': 'Reload in progress',
+            'message': 'A reload is already running'
+        }), 409
+
+    return jsonify({
+        'success': True,
+        'message': 'Reload started',
+        'version': data_processor.version
+    }), 202
 
 # ========== STATIC FILES ==========
 
@@ -269,14 +748,21 @@ if __name__ == '__main__':
     print("="*50)
     print("Campus Pulse Dashboard Starting...")
     print("="*50)
-    print(f"Data loaded: {data_processor.df.shape[0]} records")
+    print(f"Data loaded: {data_processor.num_rows} records")
     print("API Endpoints:")
     print("  GET /api/overall-metrics")
     print("  GET /api/facility-metrics")
     print("  GET /api/year-metrics")
     print("  GET /api/major-metrics")
     print("  GET /api/filtered-data")
+    print("  GET /api/export")
+    print("  GET /api/score-percentiles")
+    print("  GET /api/trends")
     print("  GET /api/insights")
+    print("  GET /api/alerts")
+    print("  POST /api/ratings")
+    print("  POST /admin/reload")
+    print("  GET /metrics")
     print("="*50)
     print("Dashboard available at: http://localhost:5000")
     print("="*50)
@@ -7,6 +7,24 @@ class Config:
     
     # Database Configuration
     DATA_FILE_PATH = '../data/campus_pulse_student_satisfaction.csv'
+    # Store dimensions as categoricals and scores as small ints; comments load lazily
+    COMPACT_DATA = True
+    # Rows per chunk when streaming the data file in; None reads it in one go
+    DATA_CHUNK_SIZE = 100000
+    # Keep a preprocessed binary snapshot next to the data file for fast restarts
+    DATA_SNAPSHOT = True
+    # Map the snapshot read-only so gunicorn workers share one copy of the columns
+    DATA_MEMORY_MAP = True
+    # Seconds between checks of the data file for changes to reload; None disables watching
+    DATA_WATCH_INTERVAL = None
+    # Worker processes that build the aggregates of large datasets in shards at startup; 1 uses one core
+    DATA_SHARDS = 1
+    # Shard by this column's values instead of by equal row ranges; None for row ranges
+    DATA_SHARD_BY = None
+    # Keep the rows in an embedded SQL database ('sqlite', 'duckdb' or 'auto') instead of in memory; None keeps them in memory
+    DATA_STORAGE = None
+    # Database file used when DATA_STORAGE is set; appended ratings are stored here too
+    DATA_STORAGE_PATH = os.path.join(os.path.dirname(DATA_FILE_PATH), 'campus_pulse.db')
     
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
@@ -14,10 +32,46 @@ class Config:
     # API Configuration
     API_TITLE = "Campus Pulse API"
     API_VERSION = "v1"
+    # Rows per page of /api/filtered-data when no limit is given, and the largest page allowed
+    PAGE_SIZE = 1000
+    MAX_PAGE_SIZE = 10000
+    # Bearer token required by the /admin endpoints; None disables them
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    # Rows encoded per chunk when streaming rows out
+    STREAM_CHUNK_SIZE = 5000
+    # Threads computing dashboard summary sections concurrently; 0 computes them in the request thread
+    SUMMARY_WORKERS = 4
+    # Seconds a summary section may take before it is served empty
+    SUMMARY_SECTION_TIMEOUT = 10
+
+    # Instrumentation Configuration
+    # Report per-section timings of every request in a Server-Timing header
+    SERVER_TIMING = True
+    # Sample the stacks of requests slower than this many seconds and log the hottest ones; None disables it
+    PROFILE_SLOW_REQUESTS = None
+    # Seconds between stack samples of a running request
+    PROFILE_INTERVAL = 0.005
+    # Directory for folded stacks of slow requests, readable by flame graph tools; None only logs them
+    PROFILE_DIR = None
+    
+    # Alert Configuration
+    # Ratings spanned by the usual satisfaction level of a facility or major, and by its recent level
+    ALERT_BASELINE_RATINGS = 500
+    ALERT_RECENT_RATINGS = 25
+    # Standard errors the recent level must fall below the usual one to raise an alert
+    ALERT_THRESHOLD = 3.0
+    # Ratings a facility or major needs before it can be alerted
+    ALERT_MIN_RATINGS = 50
     
     # CORS Configuration
     CORS_HEADERS = 'Content-Type'
     
     # Cache Configuration
+    # "SimpleCache" keeps API responses in an in-process LRU cache; "NullCache" disables it
     CACHE_TYPE = "SimpleCache"
-    CACHE_DEFAULT_TIMEOUT = 300
\ No newline at end of file
+    CACHE_DEFAULT_TIMEOUT = 300
+    # Eviction limits for the response cache
+    CACHE_MAX_ENTRIES = 512
+    CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # Cached responses at least this many bytes long are gzipped for clients that accept it; None disables it
+    COMPRESS_MIN_BYTES = 1024
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""Benchmarks of the data processor, the analytics engine and the dashboard endpoints
+
+Each benchmark runs on generated datasets of several sizes and records its
+wall time (minimum and median over several rounds) and the peak memory it
+allocates (traced in a separate round, since tracing slows it down).
+Results are compared with a stored baseline and any benchmark slower or
+hungrier than the baseline by more than the threshold is reported as a
+regression, with a non-zero exit status.
+
+Usage:
+    python benchmarks/run_benchmarks.py                    # compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1k,100k --only metrics
+    python benchmarks/run_benchmarks.py --save-baseline    # record this machine's numbers
+
+Baselines are only comparable on the machine that recorded them.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'Flask API'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'data'))
+
+from config import Config  # noqa: E402
+from generate_data import generate, write_csv  # noqa: E402
+from utils.data_processor import DataProcessor  # noqa: E402
+from utils.analytics import AnalyticsEngine  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Dataset sizes by name
+SIZES = {'1k': 1000, '100k': 100000, '1M': 1000000, '10M': 10000000}
+
+# Filters of decreasing selectivity for get_filtered_data: all rows, ~10%, ~2.5% and ~0.2%
+SELECTIVITIES = {
+    'all': {},
+    'facility': {'facility': 'Library'},
+    'facility+year': {'facility': 'Library', 'year': '2022-2023'},
+    'facility+year+major': {'facility': 'Library', 'year': '2022-2023', 'major': 'Physics'},
+}
+
+# Stop repeating a benchmark once its rounds add up to this many seconds
+TIME_BUDGET = 1.0
+MAX_ROUNDS = 20
+# Relative slowdown or memory growth over the baseline reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+
+def dataset_path(size_name):
+    """Generated dataset of one size, written on first use and reused afterwards"""
+    path = os.path.join(DATA_DIR, f'bench_{size_name}.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Generating {size_name} rows...")
+        write_csv(generate(SIZES[size_name], seed=42), path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def load_processor(path, snapshot):
+    """Data processor configured like the service, optionally without its snapshot"""
+    return DataProcessor(
+        path,
+        compact=Config.COMPACT_DATA,
+        chunk_size=Config.DATA_CHUNK_SIZE,
+        snapshot=snapshot,
+        memory_map=snapshot and Config.DATA_MEMORY_MAP,
+        shards=Config.DATA_SHARDS,
+        shard_by=Config.DATA_SHARD_BY
+    )
+
+
+def measure(func):
+    """Time func over several rounds, then trace the peak memory of one more"""
+    # The first round warms caches and isn't counted
+    started = time.perf_counter()
+    func()
+    first = time.perf_counter() - started
+
+    rounds = max(1, min(MAX_ROUNDS, int(TIME_BUDGET / max(first, 1e-9))))
+    times = []
+    for _ in range(rounds):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'rounds': rounds,
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def benchmarks(path, app_module):
+    """(name, callable) of every benchmark on one dataset, built lazily in order"""
+    yield 'load_data[csv]', lambda: load_processor(path, snapshot=False)
+
+    # Later benchmarks run against the processor the service would have: loaded from its snapshot
+    load_processor(path, snapshot=True)
+    yield 'load_data[snapshot]', lambda: load_processor(path, snapshot=True)
+
+    processor = load_processor(path, snapshot=True)
+    engine = AnalyticsEngine(processor)
+    yield 'get_overall_metrics', processor.get_overall_metrics
+    yield 'get_facility_metrics', processor.get_facility_metrics
+    yield 'get_year_metrics', processor.get_year_metrics
+    yield 'get_major_metrics', processor.get_major_metrics
+    yield 'get_time_metrics', processor.get_time_metrics
+    for name, filters in SELECTIVITIES.items():
+        # One page, as /api/filtered-data serves it
+        yield f'get_filtered_data[{name}]', \
+            lambda filters=filters: processor.get_filtered_data(filters, limit=Config.PAGE_SIZE)
+    yield 'get_trend_analysis', engine.get_trend_analysis
+    yield 'get_trends[week,facility]', lambda: processor.get_trends('week', 'facility', window=4)
+    yield 'get_insights', engine.get_insights
+
+    app_module.data_processor = processor
+    app_module.analytics_engine = engine
+    client = app_module.app.test_client()
+
+    def get(url):
+        # Measure the work behind the response, not a cache hit
+        app_module.response_cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+
+    yield 'GET /api/dashboard-summary', lambda: get('/api/dashboard-summary')
+    yield 'GET /api/filtered-dashboard-summary', \
+        lambda: get('/api/filtered-dashboard-summary?facility=Library&year=2022-2023')
+
+
+def import_app(path):
+    """Import the Flask app, starting it on a benchmark dataset instead of the configured one"""
+    Config.DATA_FILE_PATH = path
+    Config.DATA_SNAPSHOT = Config.DATA_MEMORY_MAP = False
+    Config.DATA_WATCH_INTERVAL = None
+    import app
+    return app
+
+
+def compare(results, baseline, threshold):
+    """Regressions of results against the baseline, as human-readable lines"""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric, label in (('min_s', 'time'), ('peak_mb', 'memory')):
+            # Ignore noise on measurements too small to matter
+            floor = 1e-3 if metric == 'min_s' else 1.0
+            if result[metric] > max(reference[metric], floor) * (1 + threshold):
+                regressions.append(
+                    f"{key}: {label} {result[metric]:.4g} vs baseline {reference[metric]:.4g} "
+                    f"(+{result[metric] / reference[metric] - 1:.0%})"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Campus Pulse data paths")
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"comma-separated sizes from {', '.join(SIZES)}")
+    parser.add_argument('--only', default=None, help="run benchmarks whose name contains this text")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file to compare with or save to")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown or memory growth reported as a regression")
+    parser.add_argument('--output', default=None, help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    app_module = import_app(dataset_path(sizes[0]))
+    np.seterr(all='ignore')
+
+    results = {}
+    print(f"{'benchmark':<48}{'min ms':>12}{'median ms':>12}{'rounds':>8}{'peak MB':>10}")
+    for size in sizes:
+        path = dataset_path(size)
+        for name, func in benchmarks(path, app_module):
+            if args.only and args.only not in name:
+                continue
+            key = f'{size}/{name}'
+            results[key] = measure(func)
+            result = results[key]
+            print(f"{key:<48}{result['min_s'] * 1000:>12.2f}{result['median_s'] * 1000:>12.2f}"
+                  f"{result['rounds']:>8}{result['peak_mb']:>10.1f}")
+        gc.collect()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    if args.save_baseline:
+        # Keep entries of sizes or benchmarks that weren't run this time
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                       'results': baseline}, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("No baseline to compare with; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
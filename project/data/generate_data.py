@@ -1,109 +1,216 @@
+"""Synthetic Campus Pulse ratings for demos and load testing
+
+Rows are generated in vectorized chunks. Chunk k always comes from a random
+generator seeded with (seed, k), so a dataset is reproducible from its seed
+and any shard of it can be generated on its own: the shards of a run
+concatenate to exactly the rows an unsharded run produces.
+
+Usage:
+    python generate_data.py                       # 1,200 rows, as before
+    python generate_data.py --rows 10000000 --formats csv,snapshot
+    python generate_data.py --rows 10000000 --shards 8 --shard 3
+"""
+import os
+import sys
+import time
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Generate 1200 entries
-num_entries = 1200
-
-# Create lists for different columns
-# Academic years
-academic_years = ['2021-2022', '2022-2023', '2023-2024', '2024-2025']
+# Academic years and how often each is rated
+ACADEMIC_YEARS = ['2021-2022', '2022-2023', '2023-2024', '2024-2025']
+ACADEMIC_YEAR_WEIGHTS = [0.2, 0.3, 0.3, 0.2]
 
 # Majors
-majors = ['Computer Science', 'Mechanical Engineering', 'Electrical Engineering',
+MAJORS = ['Computer Science', 'Mechanical Engineering', 'Electrical Engineering',
           'Civil Engineering', 'Business Administration', 'Biology',
           'Psychology', 'Mathematics', 'Physics', 'Chemistry',
           'English Literature', 'History', 'Economics', 'Architecture']
 
 # Facilities to be rated
-facilities = ['Library', 'Hostel', 'Cafeteria', 'Sports Complex',
+FACILITIES = ['Library', 'Hostel', 'Cafeteria', 'Sports Complex',
               'Computer Lab', 'Classrooms', 'Medical Center',
               'Administration Office', 'Auditorium', 'Parking']
 
-# Generate student IDs
-student_ids = [f'STU{10000 + i}' for i in range(num_entries)]
-
-# Generate data
-data = []
-
-for i in range(num_entries):
-    student_id = student_ids[i]
-    academic_year = np.random.choice(academic_years, p=[0.2, 0.3, 0.3, 0.2])
-    major = np.random.choice(majors)
-    facility_rated = np.random.choice(facilities)
-
-    # Generate satisfaction score (1-5 scale) with some distribution pattern
-    # Some facilities tend to have better/worse ratings
-    if facility_rated in ['Library', 'Sports Complex', 'Computer Lab']:
-        # These generally have higher ratings
-        satisfaction_score = np.random.choice([4, 5], p=[0.3, 0.7])
-    elif facility_rated in ['Hostel', 'Parking', 'Administration Office']:
-        # These generally have lower ratings
-        satisfaction_score = np.random.choice([1, 2, 3], p=[0.4, 0.4, 0.2])
-    else:
-        # Balanced distribution for others
-        satisfaction_score = np.random.randint(1, 6)
-
-    # Generate timestamps (spread over last 4 years)
-    year = int(academic_year[:4])
-    month = np.random.randint(1, 13)
-    day = np.random.randint(1, 29)
-    hour = np.random.randint(9, 18)
-    minute = np.random.randint(0, 60)
-    second = np.random.randint(0, 60)
-
-    timestamp = datetime(year, month, day, hour, minute, second)
-
-    # Add some comments (optional field with some missing values)
-    comments = ""
-    if np.random.random() < 0.3:  # 30% chance of having a comment
-        comment_templates = [
-            f"Good experience with {facility_rated.lower()}",
-            f"Needs improvement in {facility_rated.lower()}",
-            f"Satisfactory services at {facility_rated.lower()}",
-            f"Poor maintenance of {facility_rated.lower()}",
-            f"Excellent facilities at {facility_rated.lower()}",
-            f"Could be better at {facility_rated.lower()}",
-            f"Very happy with {facility_rated.lower()} services",
-            f"Disappointed with {facility_rated.lower()} condition"
-        ]
-        comments = np.random.choice(comment_templates)
-
-    data.append({
-        'student_id': student_id,
-        'academic_year': academic_year,
-        'major': major,
-        'facility_rated': facility_rated,
-        'satisfaction_score': satisfaction_score,
+# Some facilities tend to have better/worse ratings; weights are for scores 1-5
+HIGH_RATED_FACILITIES = ['Library', 'Sports Complex', 'Computer Lab']
+LOW_RATED_FACILITIES = ['Hostel', 'Parking', 'Administration Office']
+HIGH_SCORE_WEIGHTS = [0, 0, 0, 0.3, 0.7]
+LOW_SCORE_WEIGHTS = [0.4, 0.4, 0.2, 0, 0]
+BALANCED_SCORE_WEIGHTS = [0.2, 0.2, 0.2, 0.2, 0.2]
+
+# Share of ratings with a comment, and the comments to pick from
+COMMENT_RATE = 0.3
+COMMENT_TEMPLATES = [
+    "Good experience with {}",
+    "Needs improvement in {}",
+    "Satisfactory services at {}",
+    "Poor maintenance of {}",
+    "Excellent facilities at {}",
+    "Could be better at {}",
+    "Very happy with {} services",
+    "Disappointed with {} condition",
+]
+
+COLUMNS = ['student_id', 'academic_year', 'major', 'facility_rated', 'satisfaction_score', 'timestamp', 'comments']
+
+# Output formats: the CSV the service reads, the snapshot it restarts from, and its SQL storage
+FORMATS = ['csv', 'snapshot', 'sqlite', 'duckdb']
+
+
+def _score_table():
+    """Cumulative score probabilities for each facility, one row per facility"""
+    weights = []
+    for facility in FACILITIES:
+        if facility in HIGH_RATED_FACILITIES:
+            weights.append(HIGH_SCORE_WEIGHTS)
+        elif facility in LOW_RATED_FACILITIES:
+            weights.append(LOW_SCORE_WEIGHTS)
+        else:
+            weights.append(BALANCED_SCORE_WEIGHTS)
+    return np.cumsum(weights, axis=1)
+
+
+SCORE_CUMULATIVE = _score_table()
+COMMENTS = np.array([template.format(facility.lower()) for facility in FACILITIES for template in COMMENT_TEMPLATES])
+
+
+def generate_chunk(start, size, rng):
+    """Rows start to start + size, drawn from rng"""
+    academic_year = rng.choice(len(ACADEMIC_YEARS), size=size, p=ACADEMIC_YEAR_WEIGHTS)
+    major = rng.integers(len(MAJORS), size=size)
+    facility = rng.integers(len(FACILITIES), size=size)
+
+    # Invert each facility's cumulative distribution at a uniform draw
+    draws = rng.random(size)
+    score = (draws[:, None] >= SCORE_CUMULATIVE[facility]).sum(axis=1) + 1
+    score = np.minimum(score, len(BALANCED_SCORE_WEIGHTS))
+
+    # Timestamps fall in the first calendar year of the academic year, during opening hours
+    start_year = np.array([int(year[:4]) for year in ACADEMIC_YEARS])
+    timestamp = pd.to_datetime(pd.DataFrame({
+        'year': start_year[academic_year],
+        'month': rng.integers(1, 13, size=size),
+        'day': rng.integers(1, 29, size=size),
+        'hour': rng.integers(9, 18, size=size),
+        'minute': rng.integers(0, 60, size=size),
+        'second': rng.integers(0, 60, size=size),
+    }))
+
+    has_comment = rng.random(size) < COMMENT_RATE
+    template = rng.integers(len(COMMENT_TEMPLATES), size=size)
+    comments = np.where(has_comment, COMMENTS[facility * len(COMMENT_TEMPLATES) + template], '')
+
+    ids = np.arange(10000 + start, 10000 + start + size)
+    return pd.DataFrame({
+        'student_id': np.char.add('STU', ids.astype(str)),
+        'academic_year': np.array(ACADEMIC_YEARS)[academic_year],
+        'major': np.array(MAJORS)[major],
+        'facility_rated': np.array(FACILITIES)[facility],
+        'satisfaction_score': score,
         'timestamp': timestamp,
-        'comments': comments
-    })
-
-# Create DataFrame
-df = pd.DataFrame(data)
-
-# Save to CSV
-df.to_csv('campus_pulse_student_satisfaction.csv', index=False)
-
-print(f"Dataset created with {len(df)} entries")
-print("\nDataset Head:")
-print(df.head())
-print("\nDataset Info:")
-print(df.info())
-print("\nMissing Values:")
-print(df.isnull().sum())
-print("\nSatisfaction Score Distribution:")
-print(df['satisfaction_score'].value_counts().sort_index())
-
-# Generate summary statistics
-print("\nSummary Statistics:")
-print(f"Total records: {len(df)}")
-print(f"Unique students: {df['student_id'].nunique()}")
-print(f"Unique facilities: {df['facility_rated'].nunique()}")
-print(f"Date range: {df['timestamp'].min()} to {df['timestamp'].max()}")
-print(f"Average satisfaction score: {df['satisfaction_score'].mean():.2f}")
+        'comments': comments,
+    }, columns=COLUMNS)
+
+
+def shard_chunks(num_rows, chunk_size, shards=1, shard=0):
+    """(chunk number, first row, size) of the chunks one shard generates
+
+    Chunks are dealt out as contiguous runs, so each shard covers one range of rows.
+    """
+    num_chunks = -(-num_rows // chunk_size)
+    bounds = np.linspace(0, num_chunks, shards + 1).astype(int)
+    for chunk in range(bounds[shard], bounds[shard + 1]):
+        start = chunk * chunk_size
+        yield chunk, start, min(chunk_size, num_rows - start)
+
+
+def generate(num_rows, seed=42, chunk_size=500000, shards=1, shard=0):
+    """Yield the rows of one shard of a dataset as dataframes of at most chunk_size rows"""
+    if not 0 <= shard < shards:
+        raise ValueError("shard must be between 0 and shards - 1")
+    for chunk, start, size in shard_chunks(num_rows, chunk_size, shards, shard):
+        yield generate_chunk(start, size, np.random.default_rng([seed, chunk]))
+
+
+def write_csv(chunks, path):
+    """Stream chunks into a CSV file under a header, returning the number of rows written"""
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        # Written up front, so a shard without rows still loads as an empty dataset
+        pd.DataFrame(columns=COLUMNS).to_csv(f, index=False)
+        for chunk in chunks:
+            chunk.to_csv(f, header=False, index=False)
+            rows += len(chunk)
+    return rows
+
+
+def build_storage(csv_path, backend, path, chunk_size):
+    """Import the CSV into the service's SQL storage, recording it as the source of the rows"""
+    from utils.data_processor import DataProcessor
+    from utils.storage import open_storage
+
+    DataProcessor(csv_path, chunk_size=chunk_size, storage=open_storage(backend, path))
+
+
+def build_snapshot(csv_path, chunk_size):
+    """Build the binary snapshot the service loads instead of parsing the CSV"""
+    from utils.data_processor import DataProcessor
+
+    # The service's default options, so it reuses the snapshot instead of rebuilding it
+    DataProcessor(csv_path, compact=True, chunk_size=chunk_size, snapshot=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Campus Pulse ratings")
+    parser.add_argument('--rows', type=int, default=1200, help="rows in the whole dataset")
+    parser.add_argument('--seed', type=int, default=42, help="random seed; the same seed gives the same rows")
+    parser.add_argument('--chunk-size', type=int, default=500000, help="rows generated and written at a time")
+    parser.add_argument('--shards', type=int, default=1, help="split the dataset into this many shards")
+    parser.add_argument('--shard', type=int, default=0, help="shard to generate, from 0")
+    parser.add_argument('--output', default='campus_pulse_student_satisfaction.csv', help="CSV file to write")
+    parser.add_argument('--formats', default='csv',
+                        help=f"comma-separated outputs from {', '.join(FORMATS)}; the CSV is always written")
+    parser.add_argument('--storage-path', default=None, help="database file for sqlite/duckdb output")
+    args = parser.parse_args(argv)
+
+    if args.rows < 0:
+        parser.error("--rows must not be negative")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if not 0 <= args.shard < args.shards:
+        parser.error(f"--shard must be from 0 to {args.shards - 1}")
+
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(unknown)}")
+    backends = [name for name in formats if name in ('sqlite', 'duckdb')]
+    if len(backends) > 1:
+        parser.error("choose one of sqlite and duckdb")
+    if args.shards > 1 and (backends or 'snapshot' in formats):
+        parser.error("snapshot and SQL storage are built from a whole dataset, not a shard")
+
+    output = args.output
+    if args.shards > 1:
+        # Every part has a header and loads on its own
+        root, extension = os.path.splitext(output)
+        output = f'{root}.part-{args.shard:04d}-of-{args.shards:04d}{extension}'
+
+    started = time.perf_counter()
+    rows = write_csv(generate(args.rows, args.seed, args.chunk_size, args.shards, args.shard), output)
+    elapsed = time.perf_counter() - started
+    print(f"Dataset created with {rows} entries in {output} ({elapsed:.1f}s, {rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    if 'snapshot' in formats:
+        build_snapshot(output, args.chunk_size)
+    for backend in backends:
+        build_storage(output, backend, args.storage_path or os.path.splitext(output)[0] + '.db', args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
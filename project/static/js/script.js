@@ -2,16 +2,15 @@
 
 // Export data functionality
 function exportData(format = 'csv') {
-    axios.get('/api/filtered-data')
-        .then(response => {
-            if (response.data.success) {
-                const data = response.data.data;
-                
-                if (format === 'csv') {
-                    exportToCSV(data);
-                } else if (format === 'json') {
-                    exportToJSON(data);
-                }
+    if (format === 'csv') {
+        exportToCSV();
+        return;
+    }
+
+    fetchAllRows(currentFilterParams())
+        .then(data => {
+            if (format === 'json') {
+                exportToJSON(data);
             }
         })
         .catch(error => {
@@ -20,24 +19,47 @@ function exportData(format = 'csv') {
         });
 }
 
-function exportToCSV(data) {
-    if (data.length === 0) {
-        alert('No data to export');
-        return;
+// Filters currently selected on the dashboard, as query parameters
+function currentFilterParams() {
+    const params = {};
+    const filters = {
+        facility: 'facility-filter',
+        year: 'year-filter',
+        major: 'major-filter',
+        score_range: 'score-filter'
+    };
+    for (const [name, id] of Object.entries(filters)) {
+        const select = document.getElementById(id);
+        if (select && select.value) {
+            params[name] = select.value;
+        }
     }
-    
-    const headers = Object.keys(data[0]);
-    const csvContent = [
-        headers.join(','),
-        ...data.map(row => headers.map(header => JSON.stringify(row[header])).join(','))
-    ].join('\n');
-    
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
+    return params;
+}
+
+// Follow the filtered-data cursor page by page
+async function fetchAllRows(params = {}) {
+    const rows = [];
+    let cursor = null;
+    do {
+        const response = await axios.get('/api/filtered-data', {
+            params: { ...params, limit: 10000, ...(cursor !== null && { cursor }) }
+        });
+        if (!response.data.success) {
+            throw new Error(response.data.message);
+        }
+        rows.push(...response.data.data);
+        cursor = response.data.next_cursor;
+    } while (cursor !== null);
+    return rows;
+}
+
+function exportToCSV() {
+    // The server streams the file and names it, so the browser saves it as it arrives
+    const params = new URLSearchParams({ format: 'csv', ...currentFilterParams() });
     const link = document.createElement('a');
-    const url = URL.createObjectURL(blob);
     
-    link.setAttribute('href', url);
-    link.setAttribute('download', `campus_pulse_data_${new Date().toISOString().split('T')[0]}.csv`);
+    link.setAttribute('href', `/api/export?${params}`);
     link.style.visibility = 'hidden';
     
     document.body.appendChild(link);
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+import pandas as pd
+
+from utils.export import frame_to_records, ndjson_chunks
+
+
+def sample_frame():
+    return pd.DataFrame({
+        'student_id': ['STU1', 'STU2', None],
+        'satisfaction_score': [4.0, np.nan, 2.0],
+        'timestamp': pd.to_datetime(['2024-01-01 10:00:00', None, '2024-01-03 08:30:00']),
+        'comments': ['fine', np.nan, None],
+    })
+
+
+def test_records_use_none_for_missing_values():
+    records = frame_to_records(sample_frame())
+    assert records[0]['timestamp'] == '2024-01-01 10:00:00'
+    assert records[1]['timestamp'] is None
+    assert records[1]['satisfaction_score'] is None
+    assert records[1]['comments'] is None
+    assert records[2]['student_id'] is None
+
+
+def test_ndjson_lines_are_valid_json():
+    frame = sample_frame()
+    body = b''.join(ndjson_chunks([frame, frame.iloc[1:]]))
+    lines = body.decode().splitlines()
+    assert len(lines) == 5
+    # json.loads accepts NaN and Infinity unless told otherwise
+    records = [json.loads(line, parse_constant=reject_constant) for line in lines]
+    assert records[1]['timestamp'] is None
+    assert list(records[0]) == list(frame.columns)
+
+
+def reject_constant(name):
+    raise AssertionError(f"{name} is not valid JSON")
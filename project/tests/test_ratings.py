@@ -0,0 +1,57 @@
+import pandas as pd
+
+from utils.data_processor import DataProcessor
+
+
+def make_processor(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    pd.DataFrame({
+        'student_id': ['STU1', 'STU2'],
+        'academic_year': ['2023-2024', '2023-2024'],
+        'major': ['Physics', 'Chemistry'],
+        'facility_rated': ['Library', 'Cafeteria'],
+        'satisfaction_score': [4, 2],
+        'timestamp': ['2024-01-01 09:00:00', '2024-01-02 12:00:00'],
+        'comments': ['quiet', None],
+    }).to_csv(path, index=False)
+    return DataProcessor(str(path), compact=True)
+
+
+def rating(**fields):
+    record = {
+        'student_id': 'STU3',
+        'academic_year': '2023-2024',
+        'major': 'Physics',
+        'facility_rated': 'Library',
+        'satisfaction_score': 5,
+    }
+    record.update(fields)
+    return record
+
+
+def test_timestamps_with_an_offset_are_stored_as_naive_utc(tmp_path):
+    processor = make_processor(tmp_path)
+    appended, total = processor.append(rating(timestamp='2024-01-01T10:00:00+05:00'))
+    assert (appended, total) == (1, 3)
+
+    df = processor.df
+    assert pd.api.types.is_datetime64_dtype(df['timestamp'].dtype)
+    assert df['timestamp'].iloc[-1] == pd.Timestamp('2024-01-01 05:00:00')
+    assert processor.calculate_overall_metrics_from_df(df)['total_ratings'] == 3
+
+    rows = processor.get_filtered_data({'facility': 'Library'}, fields=['student_id', 'timestamp'])
+    assert rows[-1] == {'student_id': 'STU3', 'timestamp': '2024-01-01 05:00:00'}
+
+
+def test_appended_batches_are_filtered_without_merging_the_loaded_rows(tmp_path):
+    processor = make_processor(tmp_path)
+    loaded = processor.state.frames[0]
+    processor.append(rating(timestamp='2024-01-03 09:00:00'))
+    processor.append(rating(student_id='STU4', facility_rated='Gym', timestamp='2024-01-04 09:00:00'))
+
+    frames = processor.state.frames
+    assert len(frames) == 3 and frames[0] is loaded
+
+    frame = processor.get_filtered_frame({'facility': 'Library'})
+    assert frame['student_id'].astype(str).tolist() == ['STU1', 'STU3']
+    assert processor.get_distinct_values('facility_rated') == ['Cafeteria', 'Gym', 'Library']
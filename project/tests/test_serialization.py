@@ -0,0 +1,27 @@
+import decimal
+import json
+
+from flask import Flask
+
+from utils.serialization import FastJSONProvider
+
+
+def make_app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def test_dumps_honours_indent_and_default():
+    app = make_app()
+    with app.app_context():
+        assert app.json.dumps({'b': 1, 'a': [1]}, indent=2) == json.dumps({'a': [1], 'b': 1}, indent=2)
+        assert json.loads(app.json.dumps({'value': object()}, default=lambda value: 'custom')) == {'value': 'custom'}
+        assert json.loads(app.json.dumps({'value': decimal.Decimal('1.5')})) == {'value': '1.5'}
+
+
+def test_dumps_falls_back_to_the_standard_library_for_other_arguments():
+    app = make_app()
+    with app.app_context():
+        assert app.json.dumps({'a': 1}, indent=4) == json.dumps({'a': 1}, indent=4)
+        assert app.json.dumps({'é': 1}, ensure_ascii=True) == '{"\\u00e9": 1}'
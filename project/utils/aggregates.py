@@ -0,0 +1,403 @@
+import pandas as pd
+import numpy as np
+
+# Satisfaction scores are integers on a 1-5 scale
+SCORE_MIN = 1
+SCORE_MAX = 5
+SCORE_VALUES = np.arange(SCORE_MIN, SCORE_MAX + 1)
+
+# Time of day buckets, in the order groupby would list them
+TIME_OF_DAY_LABELS = ['Afternoon', 'Evening', 'Morning', 'Night']
+SATISFACTION_LABELS = ['High', 'Low', 'Medium']
+
+# Columns of a group statistics frame returned by the cube
+STAT_COLUMNS = ['rows', 'count', 'sum', 'sumsq', 'min', 'max']
+HIST_COLUMNS = [f'hist_{score}' for score in SCORE_VALUES]
+
+
+def parse_score_range(score_range):
+    """Parse a 'min-max' score range, returning None if it is malformed"""
+    if not score_range:
+        return None
+    try:
+        min_score, max_score = map(int, score_range.split('-'))
+    except ValueError:
+        return None
+    return min_score, max_score
+
+
+def time_of_day_codes(hour):
+    """Bucket hours into codes of TIME_OF_DAY_LABELS (missing hours count as Night)"""
+    hour = np.asarray(hour, dtype=float)
+    return np.select(
+        [(hour >= 5) & (hour < 12), (hour >= 12) & (hour < 17), (hour >= 17) & (hour < 22)],
+        [2, 0, 1],
+        default=3
+    ).astype(np.int32)
+
+
+def satisfaction_category_codes(score):
+    """Bucket scores into codes of SATISFACTION_LABELS (missing scores count as High)"""
+    score = np.asarray(score, dtype=float)
+    return np.select([score <= 2, score <= 3], [1, 2], default=0).astype(np.int32)
+
+
+def time_of_day(hour):
+    """Time of day categorical for a column of hours"""
+    codes = time_of_day_codes(hour.to_numpy(dtype=float, na_value=np.nan))
+    return pd.Series(pd.Categorical.from_codes(codes, TIME_OF_DAY_LABELS), index=hour.index, name='time_of_day')
+
+
+def satisfaction_category(score):
+    """Low/Medium/High categorical for a column of scores"""
+    codes = satisfaction_category_codes(score.to_numpy(dtype=float, na_value=np.nan))
+    return pd.Series(
+        pd.Categorical.from_codes(codes, SATISFACTION_LABELS), index=score.index, name='satisfaction_category'
+    )
+
+
+def month_year_codes(timestamps):
+    """Integer-code timestamps by calendar month, returning codes (-1 for missing) and 'YYYY-MM' labels"""
+    period = (timestamps.dt.year * 12 + timestamps.dt.month - 1).to_numpy(dtype=float, na_value=np.nan)
+    codes, uniques = pd.factorize(period, sort=True)
+    labels = [f'{int(p) // 12:04d}-{int(p) % 12 + 1:02d}' for p in uniques]
+    return codes.astype(np.int32), labels
+
+
+def month_year(timestamps):
+    """'YYYY-MM' categorical for a column of timestamps"""
+    codes, labels = month_year_codes(timestamps)
+    return pd.Series(pd.Categorical.from_codes(codes, labels), index=timestamps.index, name='month_year')
+
+
+def finalize_stats(stats):
+    """Add mean and sample standard deviation columns to a group statistics frame"""
+    count = stats['count'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = stats['sum'].to_numpy() / count
+        var = (stats['sumsq'].to_numpy() - stats['sum'].to_numpy() * mean) / (count - 1)
+    stats['mean'] = np.where(count > 0, mean, np.nan)
+    stats['std'] = np.where(count > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+    return stats
+
+
+class AggregateCube:
+    """Pre-aggregated score statistics for every facility x year x major x time x month cell
+
+    Each occupied cell stores the number of rows, the count, sum, sum of squares,
+    min and max of the non-missing scores, a score histogram and the timestamp
+    range. Summaries, filtered or not, are answered by rolling cells up, so
+    their cost depends on the number of cells rather than the number of ratings.
+    """
+
+    DIMENSIONS = ('facility_rated', 'academic_year', 'major', 'time_of_day', 'month_year')
+
+    def __init__(self, labels, codes, rows, hist, sums, sumsq, ts_min, ts_max):
+        self.labels = labels
+        self.codes = codes
+        self.rows = rows
+        self.hist = hist
+        self.sums = sums
+        self.sumsq = sumsq
+        self.ts_min = ts_min
+        self.ts_max = ts_max
+
+        # Min and max scores are the first and last occupied histogram bins
+        self.mins, self.maxs = self._hist_bounds(hist)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the cube with a single pass over the rows of a dataframe"""
+        if 'satisfaction_score' not in df.columns:
+            raise ValueError("satisfaction_score column is required")
+
+        scores = pd.to_numeric(df['satisfaction_score'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        valid = ~np.isnan(scores)
+        if not np.all(np.isin(scores[valid], SCORE_VALUES)):
+            raise ValueError(f"scores must be integers between {SCORE_MIN} and {SCORE_MAX}")
+
+        timestamps = cls._timestamps(df)
+        labels = {}
+        dim_codes = []
+        for dimension in cls.DIMENSIONS:
+            codes, uniques = cls._encode(df, dimension, timestamps)
+            labels[dimension] = uniques
+            dim_codes.append(codes)
+
+        cell, codes = cls._group_cells(labels, dim_codes)
+        n_cells = len(codes)
+
+        rows = np.bincount(cell, minlength=n_cells).astype(np.int64)
+        scored_cell = cell[valid]
+        score_bin = scores[valid].astype(np.int64) - SCORE_MIN
+        hist = np.bincount(
+            scored_cell * len(SCORE_VALUES) + score_bin,
+            minlength=n_cells * len(SCORE_VALUES)
+        ).reshape(n_cells, len(SCORE_VALUES)).astype(np.int64)
+        sums = np.bincount(scored_cell, weights=scores[valid], minlength=n_cells)
+        sumsq = np.bincount(scored_cell, weights=scores[valid] ** 2, minlength=n_cells)
+
+        if timestamps is not None:
+            ts = timestamps.to_numpy(dtype='datetime64[ns]')
+            ts_min, ts_max = cls._range_by_cell(ts, ts, cell, n_cells)
+        else:
+            ts_min = np.full(n_cells, np.datetime64('NaT'), dtype='datetime64[ns]')
+            ts_max = ts_min.copy()
+
+        return cls(labels, codes, rows, hist, sums, sumsq, ts_min, ts_max)
+
+    @classmethod
+    def _group_cells(cls, labels, dim_codes):
+        """Map rows (or cells) with the given per-dimension codes onto distinct cells"""
+        # Combine the per-dimension codes into one cell key (missing values shift to 0)
+        key = np.zeros(len(dim_codes[0]), dtype=np.int64)
+        for codes, dimension in zip(dim_codes, cls.DIMENSIONS):
+            key = key * (len(labels[dimension]) + 1) + (codes + 1)
+        cell, cell_keys = pd.factorize(key)
+
+        # Decode the cell keys back into per-dimension codes
+        codes = np.empty((len(cell_keys), len(cls.DIMENSIONS)), dtype=np.int32)
+        remainder = np.asarray(cell_keys, dtype=np.int64)
+        for position in range(len(cls.DIMENSIONS) - 1, -1, -1):
+            radix = len(labels[cls.DIMENSIONS[position]]) + 1
+            remainder, codes[:, position] = np.divmod(remainder, radix)
+        codes -= 1
+        return cell, codes
+
+    @staticmethod
+    def _range_by_cell(lows, highs, cell, n_cells):
+        """Earliest and latest timestamp per cell, ignoring NaT"""
+        ts_min = np.full(n_cells, np.datetime64('NaT'), dtype='datetime64[ns]')
+        ts_max = ts_min.copy()
+        has_low, has_high = ~np.isnat(lows), ~np.isnat(highs)
+        low = pd.Series(lows[has_low]).groupby(cell[has_low]).min()
+        high = pd.Series(highs[has_high]).groupby(cell[has_high]).max()
+        ts_min[low.index.to_numpy()] = low.to_numpy(dtype='datetime64[ns]')
+        ts_max[high.index.to_numpy()] = high.to_numpy(dtype='datetime64[ns]')
+        return ts_min, ts_max
+
+    def merge(self, other):
+        """Combine two cubes into a new one by adding up their cells
+
+        Cost depends on the number of cells, so new rows can be folded in as a
+        small cube without rescanning the rows already aggregated.
+        """
+        labels = {}
+        dim_codes = []
+        for position, dimension in enumerate(self.DIMENSIONS):
+            merged = list(self.labels[dimension])
+            lookup = {label: code for code, label in enumerate(merged)}
+
+            # Last slot maps the missing code -1 onto itself
+            remap = np.full(len(other.labels[dimension]) + 1, -1, dtype=np.int32)
+            for code, label in enumerate(other.labels[dimension]):
+                if label not in lookup:
+                    lookup[label] = len(merged)
+                    merged.append(label)
+                remap[code] = lookup[label]
+
+            labels[dimension] = merged
+            dim_codes.append(np.concatenate([self.codes[:, position], remap[other.codes[:, position]]]))
+
+        cell, codes = self._group_cells(labels, dim_codes)
+        n_cells = len(codes)
+
+        def add(name):
+            values = np.concatenate([getattr(self, name), getattr(other, name)])
+            if values.ndim == 1:
+                return np.bincount(cell, weights=values, minlength=n_cells)
+            return np.column_stack([
+                np.bincount(cell, weights=values[:, b], minlength=n_cells) for b in range(values.shape[1])
+            ])
+
+        ts_min, ts_max = self._range_by_cell(
+            np.concatenate([self.ts_min, other.ts_min]), np.concatenate([self.ts_max, other.ts_max]),
+            cell, n_cells
+        )
+        return AggregateCube(
+            labels, codes,
+            add('rows').astype(np.int64), add('hist').astype(np.int64).reshape(n_cells, len(SCORE_VALUES)),
+            add('sums'), add('sumsq'), ts_min, ts_max
+        )
+
+    ARRAY_NAMES = ('codes', 'rows', 'hist', 'sums', 'sumsq', 'ts_min', 'ts_max')
+
+    def to_arrays(self):
+        """Split the cube into JSON metadata and numpy arrays for persisting"""
+        meta = {'labels': self.labels, 'arrays': list(self.ARRAY_NAMES)}
+        return meta, {name: getattr(self, name) for name in self.ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, meta, arrays):
+        """Rebuild a cube persisted with to_arrays"""
+        labels = {dimension: list(meta['labels'][dimension]) for dimension in cls.DIMENSIONS}
+        return cls(labels, *(arrays[name] for name in cls.ARRAY_NAMES))
+
+    @staticmethod
+    def _timestamps(df):
+        if 'timestamp' not in df.columns:
+            return None
+        return pd.to_datetime(df['timestamp'], errors='coerce').reset_index(drop=True)
+
+    @classmethod
+    def _encode(cls, df, dimension, timestamps):
+        """Integer-code one dimension, returning codes (-1 for missing) and labels"""
+        if dimension == 'time_of_day':
+            if 'time_of_day' in df.columns:
+                return df['time_of_day'].cat.codes.to_numpy(dtype=np.int32), list(TIME_OF_DAY_LABELS)
+            hour = df['hour'] if 'hour' in df.columns else pd.Series(np.nan, index=df.index)
+            return time_of_day_codes(hour.to_numpy(dtype=float, na_value=np.nan)), list(TIME_OF_DAY_LABELS)
+
+        if dimension == 'month_year' and 'month_year' not in df.columns:
+            if timestamps is None:
+                return np.full(len(df), -1, dtype=np.int32), []
+            codes, labels = month_year_codes(timestamps)
+            return codes, labels
+
+        if dimension not in df.columns:
+            return np.full(len(df), -1, dtype=np.int32), []
+        codes, uniques = pd.factorize(df[dimension], sort=True)
+        return codes.astype(np.int32), [str(label) for label in uniques]
+
+    @staticmethod
+    def _hist_bounds(hist):
+        occupied = hist > 0
+        has_scores = occupied.any(axis=1)
+        first = np.argmax(occupied, axis=1)
+        last = len(SCORE_VALUES) - 1 - np.argmax(occupied[:, ::-1], axis=1)
+        mins = np.where(has_scores, SCORE_VALUES[first], np.nan)
+        maxs = np.where(has_scores, SCORE_VALUES[last], np.nan)
+        return mins, maxs
+
+    # ========== CELL SELECTION ==========
+
+    def _select(self, filters=None):
+        """Return the cell mask and the per-cell statistics that match the filters"""
+        mask = np.ones(len(self.rows), dtype=bool)
+        filters = filters or {}
+
+        for key, dimension in (('facility', 'facility_rated'), ('year', 'academic_year'), ('major', 'major')):
+            value = filters.get(key)
+            if value:
+                wanted = [code for code, label in enumerate(self.labels[dimension])
+                          if label.lower() == value.lower()]
+                mask &= np.isin(self.codes[:, self.DIMENSIONS.index(dimension)], wanted)
+
+        rows, hist, sums, sumsq = self.rows[mask], self.hist[mask], self.sums[mask], self.sumsq[mask]
+
+        score_range = parse_score_range(filters.get('score_range'))
+        if score_range is not None:
+            # Only scored rows inside the range survive, so rebuild the moments from the histogram
+            in_range = (SCORE_VALUES >= score_range[0]) & (SCORE_VALUES <= score_range[1])
+            hist = hist * in_range
+            rows = hist.sum(axis=1)
+            sums = hist @ SCORE_VALUES.astype(float)
+            sumsq = hist @ (SCORE_VALUES.astype(float) ** 2)
+
+        return mask, rows, hist, sums, sumsq
+
+    # ========== ROLL-UPS ==========
+
+    def summarize(self, filters=None, dimensions=DIMENSIONS):
+        """Totals and group statistics for several dimensions, selecting cells only once"""
+        selection = self._select(filters)
+        groups = {dimension: self._group_stats(selection, dimension) for dimension in dimensions}
+        return AggregateSummary(self._totals(selection), groups)
+
+    def _totals(self, selection):
+        mask, rows, hist, sums, sumsq = selection
+        totals = {
+            'rows': int(rows.sum()),
+            'count': int(hist.sum()),
+            'sum': float(sums.sum()),
+            'sumsq': float(sumsq.sum()),
+            'hist': hist.sum(axis=0),
+            'null_scores': int(rows.sum() - hist.sum())
+        }
+
+        # Only cells that still hold rows contribute to the date range
+        occupied = rows > 0
+        ts_min = self.ts_min[mask][occupied]
+        ts_max = self.ts_max[mask][occupied]
+        ts_min = ts_min[~np.isnat(ts_min)]
+        ts_max = ts_max[~np.isnat(ts_max)]
+        totals['start'] = pd.Timestamp(ts_min.min()) if len(ts_min) else pd.NaT
+        totals['end'] = pd.Timestamp(ts_max.max()) if len(ts_max) else pd.NaT
+        return totals
+
+    def _group_stats(self, selection, dimension):
+        mask, rows, hist, sums, sumsq = selection
+        codes = self.codes[mask, self.DIMENSIONS.index(dimension)]
+        labels = self.labels[dimension]
+
+        # Rows with a missing label are dropped, as groupby does
+        keep = (codes >= 0) & (rows > 0)
+        codes = codes[keep]
+        size = len(labels)
+
+        group_rows = np.bincount(codes, weights=rows[keep], minlength=size)
+        group_hist = np.column_stack([
+            np.bincount(codes, weights=hist[keep, b], minlength=size) for b in range(len(SCORE_VALUES))
+        ]).astype(np.int64) if size else np.zeros((0, len(SCORE_VALUES)), dtype=np.int64)
+        mins, maxs = self._hist_bounds(group_hist)
+
+        stats = pd.DataFrame({
+            'rows': group_rows.astype(np.int64),
+            'count': group_hist.sum(axis=1),
+            'sum': np.bincount(codes, weights=sums[keep], minlength=size),
+            'sumsq': np.bincount(codes, weights=sumsq[keep], minlength=size),
+            'min': mins,
+            'max': maxs,
+        }, index=pd.Index(labels, name=dimension))
+        for position, column in enumerate(HIST_COLUMNS):
+            stats[column] = group_hist[:, position]
+
+        stats = stats[stats['rows'] > 0].sort_index()
+        return finalize_stats(stats)
+
+
+class AggregateSummary:
+    """Totals and per-dimension statistics computed together for one set of filters"""
+
+    def __init__(self, totals, groups):
+        self.totals = totals
+        self.groups = groups
+
+    def __getitem__(self, dimension):
+        return self.groups[dimension]
+
+
+def summarize_frame(df, dimensions=AggregateCube.DIMENSIONS):
+    """Summarize rows in one pass through a throwaway cube, or None if their scores can't be binned"""
+    try:
+        return AggregateCube.from_frame(df).summarize(dimensions=dimensions)
+    except ValueError:
+        return None
+
+
+def histogram_percentiles(hist, percentiles):
+    """Exact percentiles of integer scores from one histogram per row of hist
+
+    Interpolates linearly between neighbouring scores like numpy and pandas,
+    so the result matches sorting the raw scores. Returns an array of shape
+    (len(hist), len(percentiles)), NaN where a histogram is empty.
+    """
+    hist = np.atleast_2d(np.asarray(hist, dtype=np.int64))
+    totals = hist.sum(axis=1)
+    cumulative = np.cumsum(hist, axis=1)
+    position = np.asarray(percentiles, dtype=float)[None, :] / 100 * (totals[:, None] - 1)
+
+    def score_at(rank):
+        # The score at a rank in sorted order is the first whose cumulative count exceeds it
+        return SCORE_VALUES[(cumulative[:, None, :] > rank[:, :, None]).argmax(axis=2)]
+
+    lower = np.floor(position)
+    low, high = score_at(lower), score_at(np.ceil(position))
+    result = low + (high - low) * (position - lower)
+    result[totals == 0] = np.nan
+    return result
+
+
+def histogram_median(hist):
+    """Exact median of integer scores from their histogram"""
+    return histogram_percentiles(hist, [50])[0, 0]
@@ -1,20 +1,57 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from .aggregates import AggregateCube, summarize_frame, time_of_day, month_year
+from .metrics import timed_section
 
 class AnalyticsEngine:
-    def __init__(self, data_processor):
+    def __init__(self, data_processor, df=None):
         self.data_processor = data_processor
-        self.df = data_processor.df
+        # Analyse a filtered view of the processor's rows directly when given
+        self._df = df
+
+    @property
+    def df(self):
+        """Rows under analysis, following appends to the processor"""
+        return self.data_processor.df if self._df is None else self._df
+
+    def summarize(self, filters=None, dimensions=AggregateCube.DIMENSIONS):
+        """Totals and group statistics for the rows under analysis, or None if they can't be binned"""
+        if self._df is None:
+            return self.data_processor.summarize(filters, dimensions)
+        return summarize_frame(self._df, dimensions)
+
+    def _has_data(self):
+        if self._df is None:
+            return self.data_processor.has_data()
+        return not self._df.empty
+
+    def _has_column(self, column):
+        if self._df is None:
+            return self.data_processor.has_column(column)
+        return column in self._df.columns
     
-    def get_trend_analysis(self):
+    @timed_section('trends')
+    def get_trend_analysis(self, filters=None, summary=None):
         """Analyze trends over time"""
-        if self.df is None or self.df.empty or 'timestamp' not in self.df.columns:
+        if not self._has_data() or not self._has_column('timestamp'):
             return {}
         
+        summary = summary or self.summarize(filters, dimensions=['month_year'])
+        if summary is not None:
+            monthly_trend = summary['month_year']['mean']
+            return {
+                'labels': monthly_trend.index.tolist(),
+                'scores': monthly_trend.round(2).tolist()
+            }
+        
         # Monthly trend
-        self.df['month_year'] = self.df['timestamp'].dt.to_period('M').astype(str)
-        monthly_trend = self.df.groupby('month_year')['satisfaction_score'].mean().reset_index()
+        df = self.df
+        if self._has_column('month_year'):
+            month_year_column = df['month_year']
+        else:
+            month_year_column = month_year(df['timestamp'])
+        monthly_trend = df.groupby(month_year_column, observed=True)['satisfaction_score'].mean().reset_index()
         
         # Convert to list for chart
         trend_data = {
@@ -26,13 +63,16 @@ class AnalyticsEngine:
     
     def get_correlation_analysis(self):
         """Calculate correlations between variables"""
-        if self.df is None or self.df.empty:
+        df = self.df
+        if df is None or df.empty:
             return {}
         
         # Create correlation matrix
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.difference(
+            self.data_processor.INTERNAL_COLUMNS, sort=False
+        )
         if len(numeric_cols) > 1:
-            correlation_matrix = self.df[numeric_cols].corr().round(3)
+            correlation_matrix = df[numeric_cols].corr().round(3)
             
             # Convert to dictionary
             correlations = {}
@@ -43,15 +83,22 @@ class AnalyticsEngine:
         
         return {}
     
-    def get_insights(self):
+    @timed_section('insights')
+    def get_insights(self, filters=None, summary=None):
         """Generate actionable insights"""
-        if self.df is None or self.df.empty:
+        if not self._has_data():
             return []
         
         insights = []
+        summary = summary or self.summarize(filters, dimensions=['facility_rated', 'academic_year', 'time_of_day'])
+        # Rows are only needed when they couldn't be summarized
+        df = self.df if summary is None else None
         
         # Facility insights
-        facility_stats = self.df.groupby('facility_rated')['satisfaction_score'].mean()
+        if summary is not None:
+            facility_stats = summary['facility_rated']['mean']
+        else:
+            facility_stats = df.groupby('facility_rated', observed=True)['satisfaction_score'].mean()
         best_facility = facility_stats.idxmax()
         worst_facility = facility_stats.idxmin()
         
@@ -72,8 +119,11 @@ class AnalyticsEngine:
         })
         
         # Trend insight
-        if 'academic_year' in self.df.columns:
-            year_trend = self.df.groupby('academic_year')['satisfaction_score'].mean()
+        if self._has_column('academic_year'):
+            if summary is not None:
+                year_trend = summary['academic_year']['mean']
+            else:
+                year_trend = df.groupby('academic_year', observed=True)['satisfaction_score'].mean()
             if len(year_trend) > 1:
                 trend = 'increasing' if year_trend.iloc[-1] > year_trend.iloc[0] else 'decreasing'
                 insights.append({
@@ -85,13 +135,15 @@ class AnalyticsEngine:
                 })
         
         # Time insight
-        if 'hour' in self.df.columns:
-            self.df['time_category'] = self.df['hour'].apply(
-                lambda x: 'Morning' if 5 <= x < 12 else 
-                         ('Afternoon' if 12 <= x < 17 else 
-                         ('Evening' if 17 <= x < 22 else 'Night'))
-            )
-            time_stats = self.df.groupby('time_category')['satisfaction_score'].mean()
+        if self._has_column('hour'):
+            if summary is not None:
+                time_stats = summary['time_of_day']['mean']
+            else:
+                if self._has_column('time_of_day'):
+                    time_category = df['time_of_day']
+                else:
+                    time_category = time_of_day(df['hour'])
+                time_stats = df.groupby(time_category, observed=True)['satisfaction_score'].mean()
             best_time = time_stats.idxmax()
             
             insights.append({
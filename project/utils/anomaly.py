@@ -0,0 +1,250 @@
+import pandas as pd
+import numpy as np
+
+# Exponentially weighted sums kept per window: of scores, of squared scores and of the weights
+WINDOW_COLUMNS = ['sum', 'sum_sq', 'weight']
+# Ratings weighing less than this share of the latest one no longer change the sums of a double
+NEGLIGIBLE_WEIGHT = 1e-17
+
+
+def _window_columns(window):
+    return [f'{window}_{column}' for column in WINDOW_COLUMNS]
+
+
+def _alpha(ratings):
+    """Smoothing factor of an exponentially weighted mean spanning about this many ratings"""
+    return 2.0 / (ratings + 1)
+
+
+def _widen(values, size, fill):
+    """Values followed by fill up to size"""
+    widened = np.full(size, fill, dtype=values.dtype)
+    widened[:len(values)] = values
+    return widened
+
+
+def _reverse_ranks(codes, counts):
+    """Position of each observation counted from the last one of its group, in the given order"""
+    if len(counts) <= np.iinfo(np.int16).max:
+        # Small integers are stably sorted by radix sort
+        codes = codes.astype(np.int16)
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(counts) - counts
+    ranks = np.empty(len(codes), dtype=np.int64)
+    ranks[order] = np.arange(len(codes)) - starts[codes[order]]
+    return counts[codes] - 1 - ranks
+
+
+class AnomalyDetector:
+    """Exponentially weighted satisfaction statistics per facility and major, with drop alarms
+
+    Each facility and major keeps a fixed handful of numbers: the number of
+    ratings, the time of the latest one, and for a long baseline window and a
+    short recent window the exponentially weighted sums of scores, squared
+    scores and weights. Those give the baseline mean and variance and the
+    recent mean, and a group is alerted when the recent mean sits threshold
+    standard errors or more below the baseline (a z-score on the recent
+    window). A batch of ratings updates the sums in time order in one
+    vectorized pass, and alerts are read off the sums, so neither costs more
+    as history grows.
+
+    The statistics of a dimension are plain arrays aligned with its array of
+    group labels, so restoring a detector is a handful of array conversions.
+    Like the aggregate cube, a detector is never changed: update returns a new one.
+    """
+
+    DIMENSIONS = {'facility': 'facility_rated', 'major': 'major'}
+    WINDOWS = ('baseline', 'recent')
+
+    def __init__(self, baseline=500, recent=25, threshold=3.0, min_ratings=50, stats=None):
+        self.baseline = baseline
+        self.recent = recent
+        self.threshold = threshold
+        self.min_ratings = min_ratings
+        self.alphas = {'baseline': _alpha(baseline), 'recent': _alpha(recent)}
+        if stats is None:
+            stats = {dimension: self._empty_stats() for dimension in self.DIMENSIONS}
+        # Dimension -> column -> array, one entry per label in 'labels'
+        self.stats = stats
+
+    def _empty_stats(self):
+        stats = {
+            'labels': np.array([], dtype=object),
+            'count': np.array([], dtype=np.int64),
+            'last_rating': np.array([], dtype='datetime64[ns]'),
+        }
+        for window in self.WINDOWS:
+            stats.update({column: np.array([], dtype=float) for column in _window_columns(window)})
+        return stats
+
+    def _with_stats(self, stats):
+        return AnomalyDetector(self.baseline, self.recent, self.threshold, self.min_ratings, stats)
+
+    # ========== PERSISTENCE ==========
+
+    def to_state(self):
+        """Statistics as plain JSON values, for saving with a snapshot or in storage"""
+        stats = {}
+        for dimension, columns in self.stats.items():
+            stats[dimension] = {column: values.tolist() for column, values in columns.items() if column != 'last_rating'}
+            last = columns['last_rating']
+            # NaT is stored as None
+            stats[dimension]['last_rating'] = np.where(np.isnat(last), None, last.view(np.int64).astype(object)).tolist()
+        return {'baseline': self.baseline, 'recent': self.recent, 'stats': stats}
+
+    def restore(self, state):
+        """Detector with these settings and saved statistics, or None if they were kept over other windows"""
+        if not state or state.get('baseline') != self.baseline or state.get('recent') != self.recent:
+            return None
+        stats = {}
+        for dimension in self.DIMENSIONS:
+            saved = state['stats'][dimension]
+            columns = {
+                'labels': np.array(saved['labels'], dtype=object),
+                'count': np.array(saved['count'], dtype=np.int64),
+                # NaT is stored as None and is the smallest int64 as a datetime64
+                'last_rating': np.array(
+                    [np.iinfo(np.int64).min if value is None else value for value in saved['last_rating']], dtype=np.int64
+                ).view('datetime64[ns]'),
+            }
+            for window in self.WINDOWS:
+                columns.update({column: np.array(saved[column], dtype=float) for column in _window_columns(window)})
+            stats[dimension] = columns
+        return self._with_stats(stats)
+
+    # ========== UPDATES ==========
+
+    def update(self, frame):
+        """New detector with a batch of rows added, taken in timestamp order"""
+        if frame is None or not len(frame) or 'satisfaction_score' not in frame.columns:
+            return self
+
+        scores = pd.to_numeric(frame['satisfaction_score'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        if 'timestamp' in frame.columns:
+            times = frame['timestamp'].to_numpy(dtype='datetime64[ns]')
+            # Rows without a timestamp sort first, as the oldest; ties keep no particular order
+            order = np.argsort(times.view(np.int64))
+            times, scores = times[order], scores[order]
+        else:
+            order = None
+            times = np.full(len(frame), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+        stats = dict(self.stats)
+        for dimension, column in self.DIMENSIONS.items():
+            if column not in frame.columns:
+                continue
+            codes, labels = pd.factorize(frame[column])
+            if order is not None:
+                codes = codes[order]
+            keep = (codes >= 0) & ~np.isnan(scores)
+            batch = self._batch_stats(codes[keep], scores[keep], times[keep], [str(label) for label in labels])
+            stats[dimension] = self._merge(stats[dimension], batch)
+        return self._with_stats(stats)
+
+    def _batch_stats(self, codes, scores, times, labels):
+        """Statistics of one batch per group, as if each group started from nothing"""
+        size = len(labels)
+        counts = np.bincount(codes, minlength=size)
+        ranks = _reverse_ranks(codes, counts)
+        columns = {'count': counts}
+
+        # Latest timestamp per group, read off each group's last observation
+        last = np.full(size, np.datetime64('NaT'), dtype='datetime64[ns]')
+        final = ranks == 0
+        last[codes[final]] = times[final]
+        columns['last_rating'] = last
+
+        for window, alpha in self.alphas.items():
+            # The k-th rating from the end of a group weighs alpha * (1 - alpha) ** k, so only
+            # the latest few thousand ratings of each group carry any weight
+            horizon = int(np.log(NEGLIGIBLE_WEIGHT) / np.log(1 - alpha)) + 1
+            rows = np.flatnonzero(ranks < horizon)
+            weights = alpha * (1 - alpha) ** ranks[rows]
+            window_codes, window_scores = codes[rows], scores[rows]
+            total, total_sq, weight = _window_columns(window)
+            columns[total] = np.bincount(window_codes, weights=weights * window_scores, minlength=size)
+            columns[total_sq] = np.bincount(window_codes, weights=weights * window_scores ** 2, minlength=size)
+            columns[weight] = np.bincount(window_codes, weights=weights, minlength=size)
+
+        columns['labels'] = np.array(labels, dtype=object)
+        seen = counts > 0
+        return {column: values[seen] for column, values in columns.items()}
+
+    def _merge(self, stats, batch):
+        """Statistics after the batch's ratings followed those already counted"""
+        if not len(batch['labels']):
+            return stats
+        # Position of each batch group among the merged labels, new groups going last
+        positions = {label: position for position, label in enumerate(stats['labels'])}
+        slots = np.array([positions.get(label, -1) for label in batch['labels']], dtype=np.int64)
+        new = slots < 0
+        slots[new] = len(positions) + np.arange(new.sum())
+        size = len(positions) + int(new.sum())
+
+        def placed(values, fill):
+            spread = np.full(size, fill, dtype=values.dtype)
+            spread[slots] = values
+            return spread
+
+        counts = placed(batch['count'], 0)
+        merged = {
+            'labels': np.concatenate([stats['labels'], batch['labels'][new]]),
+            'count': _widen(stats['count'], size, 0) + counts,
+            'last_rating': np.fmax(
+                _widen(stats['last_rating'], size, np.datetime64('NaT')), placed(batch['last_rating'], np.datetime64('NaT'))
+            ),
+        }
+        for window, alpha in self.alphas.items():
+            # Earlier ratings decay once per rating of the batch in the same group
+            decay = (1 - alpha) ** counts
+            for column in _window_columns(window):
+                merged[column] = _widen(stats[column], size, 0.0) * decay + placed(batch[column], 0.0)
+        return merged
+
+    # ========== ALERTS ==========
+
+    def status(self, dimension):
+        """Baseline and recent means with the z-score of every group of a dimension, as arrays aligned with its labels"""
+        stats = self.stats[dimension]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            baseline = stats['baseline_sum'] / stats['baseline_weight']
+            variance = np.clip(stats['baseline_sum_sq'] / stats['baseline_weight'] - baseline ** 2, 0, None)
+            recent = stats['recent_sum'] / stats['recent_weight']
+            # Standard error of a recent-window mean of ratings spread like the baseline
+            alpha = self.alphas['recent']
+            error = np.sqrt(variance * alpha / (2 - alpha))
+            z_score = np.where(error > 0, (recent - baseline) / error, np.nan)
+        return {
+            'labels': stats['labels'],
+            'count': stats['count'],
+            'last_rating': stats['last_rating'],
+            'baseline': baseline,
+            'std': np.sqrt(variance),
+            'recent': recent,
+            'z_score': z_score,
+        }
+
+    def alerts(self, dimension=None):
+        """Groups whose recent satisfaction dropped below their baseline, worst first"""
+        if dimension is not None and dimension not in self.DIMENSIONS:
+            raise ValueError(f"dimension must be one of {', '.join(self.DIMENSIONS)}")
+
+        alerts = []
+        for name in [dimension] if dimension else self.DIMENSIONS:
+            status = self.status(name)
+            with np.errstate(invalid='ignore'):
+                flagged = (status['count'] >= self.min_ratings) & (status['z_score'] <= -self.threshold)
+            for position in np.flatnonzero(flagged):
+                recent, baseline, last = status['recent'][position], status['baseline'][position], status['last_rating'][position]
+                alerts.append({
+                    'dimension': name,
+                    'name': status['labels'][position],
+                    'recent_average': round(float(recent), 2),
+                    'baseline_average': round(float(baseline), 2),
+                    'drop': round(float(baseline - recent), 2),
+                    'z_score': round(float(status['z_score'][position]), 2),
+                    'total_ratings': int(status['count'][position]),
+                    'last_rating': None if np.isnat(last) else pd.Timestamp(last).isoformat(),
+                })
+        alerts.sort(key=lambda alert: alert['z_score'])
+        return alerts
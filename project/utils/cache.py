@@ -0,0 +1,89 @@
+import gzip
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """Serialized response body with its strong ETag"""
+
+    def __init__(self, body, mimetype, created):
+        self.body = body
+        self.mimetype = mimetype
+        self.created = created
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._gzipped = None
+
+    def gzipped(self):
+        """Body compressed with gzip, computed on the first request that accepts it and kept with the entry"""
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized API responses
+
+    Keys include the dataset version, so appends and reloads never serve stale
+    entries; they just stop being hit and age out. Entries are evicted least
+    recently used first once either the entry count or the total body size
+    exceeds its limit, and expire after timeout seconds.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, timeout=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached response for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.timeout and time.monotonic() - entry.created > self.timeout:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        """Store a response body and return its cache entry
+
+        Misses are counted here rather than in get, so responses that turn out
+        uncacheable, such as errors and streams, don't count as misses.
+        """
+        entry = CachedResponse(body, mimetype, time.monotonic())
+        with self._lock:
+            self.misses += 1
+        if len(body) > self.max_bytes:
+            # Too large to keep, but callers still get an ETag
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
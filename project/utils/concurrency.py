@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SectionExecutor:
+    """Bounded thread pool that computes independent response sections concurrently
+
+    The numpy and pandas kernels behind each section release the GIL, so the
+    sections of one summary overlap instead of running back to back. A
+    section that fails or misses the timeout is replaced by its fallback
+    value and reported, so the rest of the response is still served.
+    """
+
+    def __init__(self, max_workers=4, timeout=None):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summary-section')
+
+    def call(self, func):
+        """Run one callable in the pool under the timeout, raising its error or TimeoutError"""
+        future = self._pool.submit(func)
+        try:
+            return future.result(timeout=self.timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    def run(self, sections, fallbacks=None):
+        """Run {name: callable} and return ({name: result}, names of sections that fell back)"""
+        fallbacks = fallbacks or {}
+        futures = {name: self._pool.submit(section) for name, section in sections.items()}
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+
+        results, incomplete = {}, []
+        for name, future in futures.items():
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            try:
+                results[name] = future.result(timeout=remaining)
+            except Exception as e:
+                # A timed-out section keeps running in the pool; its result is dropped
+                future.cancel()
+                print(f"Summary section '{name}' unavailable: {type(e).__name__}: {e}")
+                results[name] = fallbacks.get(name)
+                incomplete.append(name)
+        return results, incomplete
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,39 +1,713 @@
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 from datetime import datetime
+import threading
+import time
 import json
+from collections import Counter
+from .aggregates import AggregateCube, histogram_median, histogram_percentiles, time_of_day, month_year, satisfaction_category, SCORE_VALUES, HIST_COLUMNS
+from .indexes import InvertedIndex
+from .snapshot import DatasetSnapshot, SourceChangedError, snapshot_path_for, file_signature, same_source, source_unchanged
+from .export import frame_to_records
+from .serialization import frame_columns, columns_to_records
+from .sharding import build_cube_sharded, MIN_SHARD_ROWS
+from .storage import COLUMNS as STORAGE_COLUMNS
+from .metrics import timed_section, rows_scanned, dataset_load_seconds
+from .trends import GRANULARITIES, day_codes, daily_stats, build_trends
+from .anomaly import AnomalyDetector
+
+
+class DatasetState:
+    """One version of the dataset: the rows with the cube and indexes built from them
+
+    A state is never changed once requests can see it. Appends and reloads
+    build a new state and swap it in, so a request pinned to a state keeps a
+    consistent view until it finishes.
+    """
+
+    def __init__(self, df, cube, index, version=0, appended=(), base_comments=None, storage=None, detector=None,
+                 source=None):
+        self._df = df
+        self.cube = cube
+        self.index = index
+        # Rolling satisfaction statistics behind the drop alerts, covering every row of this state
+        self.detector = detector
+        self.version = version
+        # When this version was swapped in, after a load, reload or append
+        self.updated_at = None
+        # (frame, comments) batches appended since the data file was loaded, kept apart from the loaded rows
+        self.appended = tuple(appended)
+        self.base_comments = base_comments
+        self.comments = None
+        # Signature of the data file the base rows were read from; lazy columns are only read from that file
+        self.source = source
+        self.base_rows = len(df)
+        self.num_rows = len(df) + sum(len(frame) for frame, _ in self.appended)
+        self.columns = df.columns
+        # SQL storage holding the rows when they aren't kept in memory
+        self.storage = storage
+        if storage is not None:
+            self.num_rows = storage.count()
+
+    @classmethod
+    def over_storage(cls, storage, detector=None):
+        """State whose rows live in a storage backend, with an empty frame describing the columns"""
+        return cls(pd.DataFrame(columns=list(STORAGE_COLUMNS)), None, None, storage=storage, detector=detector)
+
+    @property
+    def frames(self):
+        """The loaded rows followed by each appended batch"""
+        return [self._df] + [frame for frame, _ in self.appended]
+
+    @property
+    def df(self):
+        """All rows as one frame; with appended batches this concatenates every row, so prefer take()"""
+        return self.take()
+
+    def take(self, rows=None, columns=None):
+        """Rows at sorted positions (all rows if None) and the given columns, copying only those
+
+        Positions are split between the loaded rows and the appended batches,
+        and just the selected slices are concatenated.
+        """
+        frames = self.frames
+        if columns is not None:
+            frames = [frame[list(columns)] for frame in frames]
+        if rows is not None:
+            rows = np.asarray(rows)
+            starts = np.cumsum([0] + [len(frame) for frame in frames])
+            bounds = np.searchsorted(rows, starts)
+            parts = []
+            for frame, start, lo, hi in zip(frames, starts, bounds, bounds[1:]):
+                # Keep the loaded rows' slice even when empty, so the result still has their columns and dtypes
+                if hi > lo or not parts:
+                    parts.append(frame.iloc[rows[lo:hi] - start])
+            frames = parts
+        if len(frames) == 1:
+            return frames[0]
+        # Slices merge only the categories they use rather than the full dictionaries
+        return DataProcessor.concat_frames(frames, used_categories=rows is not None)
+
+    def with_batch(self, frame, comments, cube, index, version, detector=None):
+        """New state with one more appended batch"""
+        return DatasetState(
+            self._df, cube, index, version,
+            self.appended + ((frame, comments),), self.base_comments, detector=detector, source=self.source
+        )
+
 
 class DataProcessor:
-    def __init__(self, data_path):
+    # Low-cardinality text columns stored as categoricals in compact mode
+    CATEGORY_COLUMNS = ['student_id', 'academic_year', 'major', 'facility_rated']
+    DERIVED_CATEGORY_COLUMNS = ['day_name']
+    SMALL_INT_COLUMNS = {'satisfaction_score': 'Int8', 'year': 'Int16', 'month': 'Int8', 'hour': 'Int8'}
+    LAZY_COLUMNS = ['comments']
+    # Fields a new rating must provide, as they appear in the data file
+    REQUIRED_FIELDS = ['student_id', 'academic_year', 'major', 'facility_rated', 'satisfaction_score']
+    SOURCE_COLUMNS = REQUIRED_FIELDS + ['timestamp', 'comments']
+    # Columns telling an appended rating apart when looking for it in a reloaded data file
+    RATING_KEY = ['student_id', 'facility_rated', 'timestamp', 'satisfaction_score']
+    # Groupings offered for score percentiles
+    PERCENTILE_GROUPS = {'facility': 'facility_rated', 'year': 'academic_year', 'major': 'major'}
+    # Groupings offered for per-dimension trend series
+    TREND_GROUPS = PERCENTILE_GROUPS
+    # Derived columns used internally and left out of filtered-data rows
+    INTERNAL_COLUMNS = ['day_code']
+    # Metrics of each group breakdown, as listed next to 'labels' in the columnar shape
+    GROUP_METRICS = {
+        'facility': ['total_ratings', 'average_score', 'std_deviation', 'min_score', 'max_score', 'rank'],
+        'academic_year': ['total_ratings', 'average_score', 'std_deviation'],
+        'major': ['total_ratings', 'average_score', 'std_deviation'],
+        'time_of_day': ['total_ratings', 'average_score'],
+    }
+
+    def __init__(self, data_path, compact=False, chunk_size=None, snapshot=False, memory_map=False,
+                 shards=0, shard_by=None, storage=None, detector=None):
         self.data_path = data_path
-        self.df = None
+        self.compact = compact
+        self.chunk_size = chunk_size
+        # Memory-mapped columns are served from the snapshot, so it is required
+        self.memory_map = memory_map
+        # Worker processes that aggregate shards of large datasets; 0 aggregates in-process
+        self.shards = shards
+        self.shard_by = shard_by
+        # SQL backend (see utils.storage) that keeps the rows on disk instead of in memory
+        self.storage = storage
+        # Empty detector (see utils.anomaly) whose settings every load starts from
+        self.detector = detector if detector is not None else AnomalyDetector()
+        self.snapshot = DatasetSnapshot(snapshot_path_for(data_path)) if snapshot or memory_map else None
+        self._state = None
+        self._version = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._reload_thread = None
+        # Held through every reload, so reloads from the watcher and the admin endpoint run one at a time
+        self._reload_lock = threading.Lock()
+        self._watcher = None
         self.load_data()
+
+    # ========== DATASET STATE ==========
+
+    @property
+    def state(self):
+        """State pinned by the current request, or the latest one"""
+        return getattr(self._local, 'state', None) or self._state
+
+    def pin(self):
+        """Keep serving the current state to this thread until unpin is called"""
+        self._local.state = self._state
+        return self._local.state
+
+    def unpin(self):
+        self._local.state = None
+
+    def bind(self, func):
+        """Wrap func to run against this thread's current state when called from another thread"""
+        state = self.state
+
+        def bound(*args, **kwargs):
+            previous = getattr(self._local, 'state', None)
+            self._local.state = state
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.state = previous
+        return bound
+
+    def _swap(self, state):
+        """Make a new state visible to requests that start from now on"""
+        with self._lock:
+            self._version += 1
+            state.version = self._version
+            state.updated_at = pd.Timestamp.now()
+            self._state = state
+
+    @property
+    def df(self):
+        """Loaded and appended rows as one frame, concatenated on each access once rows are appended"""
+        state = self.state
+        return state.df if state is not None else None
+
+    @property
+    def cube(self):
+        state = self.state
+        return state.cube if state is not None else None
+
+    @property
+    def index(self):
+        state = self.state
+        return state.index if state is not None else None
+
+    @property
+    def version(self):
+        """Number that changes whenever the dataset is reloaded or appended to"""
+        state = self.state
+        return state.version if state is not None else 0
+
+    @property
+    def updated_at(self):
+        """Time the served version of the dataset was loaded or last appended to"""
+        state = self.state
+        return state.updated_at if state is not None else None
+
+    @property
+    def num_rows(self):
+        """Number of rows, without merging appended rows into the frame"""
+        state = self.state
+        return state.num_rows if state is not None else 0
+
+    def has_data(self):
+        """Whether any rows are loaded"""
+        return self.num_rows > 0
+
+    def has_column(self, column):
+        """Whether the loaded rows have a column"""
+        state = self.state
+        return state is not None and column in state.columns
+
+    # ========== LOADING ==========
     
     def load_data(self):
         """Load and preprocess data"""
+        started = time.perf_counter()
+        state, _ = self.build_state()
+        dataset_load_seconds.set(time.perf_counter() - started)
+        self._swap(state)
+
+    @timed_section('load')
+    def build_state(self):
+        """Load the data file (or its snapshot) into a new state, returning it and whether the file was read"""
+        if self.storage is not None:
+            return self.load_storage()
+        if self.snapshot is None:
+            return self.load_source()
+
+        # Only one worker rebuilds a stale snapshot; the others wait and reuse it
+        with self.snapshot.lock():
+            state = self.load_snapshot()
+            if state is not None:
+                return state, True
+            state, loaded = self.load_source()
+            if not loaded:
+                return state, False
+            self.save_snapshot(state)
+
+        if self.memory_map:
+            # Drop the private copy and map the snapshot shared by every worker
+            state = self.load_snapshot() or state
+        return state, True
+
+    def load_source(self):
+        """Load the data file and build the cube and indexes, returning False on sample data"""
+        source = None
         try:
-            self.df = pd.read_csv(self.data_path)
-            
-            # Ensure proper data types
-            if 'timestamp' in self.df.columns:
-                self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-                self.df['year'] = self.df['timestamp'].dt.year
-                self.df['month'] = self.df['timestamp'].dt.month
-                self.df['day_name'] = self.df['timestamp'].dt.day_name()
-                self.df['hour'] = self.df['timestamp'].dt.hour
-            
-            # Categorize satisfaction scores
-            if 'satisfaction_score' in self.df.columns:
-                self.df['satisfaction_category'] = self.df['satisfaction_score'].apply(
-                    lambda x: 'Low' if x <= 2 else ('Medium' if x <= 3 else 'High')
-                )
+            # Taken before reading, so a file replaced meanwhile no longer matches it
+            source = file_signature(self.data_path)
+            if self.chunk_size:
+                df = self.read_chunked()
+            else:
+                df = self.prepare_frame(self.read_csv())
                 
-            print(f"Data loaded successfully: {self.df.shape[0]} rows, {self.df.shape[1]} columns")
+            print(f"Data loaded successfully: {df.shape[0]} rows, {df.shape[1]} columns")
+            loaded = True
             
         except Exception as e:
             print(f"Error loading data: {e}")
             # Create sample data if file not found
-            self.create_sample_data()
+            df = self.create_sample_data()
+            source = None
+            loaded = False
+
+        state = DatasetState(df, self.build_cube(df), self.build_index(df), detector=self.build_detector(df), source=source)
+        return state, loaded
+
+    def load_storage(self):
+        """Import the data file into the storage backend if it changed since the last import"""
+        storage = self.storage
+        try:
+            imported = False
+            if storage.is_current(self.data_path):
+                print(f"Data served from {storage.name} storage at {storage.path}")
+            else:
+                imported = True
+                signature = file_signature(self.data_path, with_hash=True)
+                chunks = pd.read_csv(self.data_path, chunksize=self.chunk_size or 100000)
+                rows = storage.replace_source((self.prepare_frame(chunk) for chunk in chunks), signature)
+                print(f"Data imported into {storage.name} storage: {rows} rows")
+            loaded = True
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            if storage.count() == 0:
+                storage.replace_source([self.prepare_frame(self.create_sample_data())], None)
+            loaded = imported = False
+
+        # Detector statistics are kept next to the rows, and rebuilt from them once after an import
+        detector = self.detector.restore(storage.meta('detector')) if not imported else None
+        if detector is None:
+            detector = self.detector
+            for frame in storage.iter_by_time(['timestamp', 'satisfaction_score'] + list(AnomalyDetector.DIMENSIONS.values())):
+                detector = detector.update(frame)
+            storage.set_meta('detector', detector.to_state())
+        return DatasetState.over_storage(storage, detector), loaded
+
+    def reload(self, background=False):
+        """Rebuild the dataset from the data file and swap it in once it is ready
+
+        Requests already running finish against the old state. Ratings appended
+        since the last load are folded into the new state before the swap,
+        except those the data file now holds itself; with a storage backend
+        they are already stored alongside the imported rows. A reload waits
+        for one already running, such as the watcher's, to finish. Returns
+        False if a background reload is already running or the file could not
+        be read.
+        """
+        if background:
+            with self._lock:
+                if self._reload_thread is not None and self._reload_thread.is_alive():
+                    return False
+                self._reload_thread = threading.Thread(target=self.reload, name='dataset-reload', daemon=True)
+                self._reload_thread.start()
+            return True
+
+        with self._reload_lock:
+            started = time.perf_counter()
+            state, loaded = self.build_state()
+            dataset_load_seconds.set(time.perf_counter() - started)
+            if not loaded:
+                print("Reload skipped: data file could not be read")
+                return False
+
+            # Only appends swap states while the reload lock is held, and they extend the
+            # appended batches, so those seen here stay a prefix of the ones at the swap.
+            # They are matched outside the state lock; batches appended meanwhile are replayed whole
+            appended = self._state.appended
+            unsaved = self.unsaved_batches(state, appended, self._state.source)
+            with self._lock:
+                for frame, comments in unsaved + self._state.appended[len(appended):]:
+                    state = self._with_batch(state, frame, comments)
+                self._swap(state)
+        print(f"Dataset reloaded: {state.num_rows} rows (version {state.version})")
+        return True
+
+    def unsaved_batches(self, state, appended, source):
+        """Appended batches without the ratings a freshly loaded state's data file already holds
+
+        The batches were appended to rows loaded from source. If the file is
+        unchanged they are all still missing from it; otherwise each rating is
+        looked up by RATING_KEY, one file row matching at most one rating.
+        """
+        if not appended or state.source is None or (source is not None and same_source(state.source, source)):
+            return appended
+
+        times = pd.concat([frame['timestamp'] for frame, _ in appended], ignore_index=True)
+        df = state.df
+        candidates = df.loc[df['timestamp'].isin(times), self.RATING_KEY]
+        saved = Counter(self._rating_keys(candidates))
+
+        unsaved = []
+        for frame, comments in appended:
+            keep = np.ones(len(frame), dtype=bool)
+            for position, key in enumerate(self._rating_keys(frame)):
+                if saved[key] > 0:
+                    saved[key] -= 1
+                    keep[position] = False
+            if keep.all():
+                unsaved.append((frame, comments))
+            elif keep.any():
+                frame = frame[keep].reset_index(drop=True)
+                comments = comments[keep].reset_index(drop=True) if comments is not None else None
+                unsaved.append((frame, comments))
+        return tuple(unsaved)
+
+    def _rating_keys(self, frame):
+        """RATING_KEY values of each row, comparable whatever dtypes the columns were loaded as"""
+        return zip(
+            frame['student_id'].astype(str),
+            frame['facility_rated'].astype(str),
+            frame['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+            frame['satisfaction_score'].to_numpy(dtype=float),
+        )
+
+    def watch(self, interval):
+        """Reload in the background whenever the data file changes
+
+        A change is picked up once the file has stopped changing for one
+        interval, so a file that is still being written is not loaded.
+        """
+        if self._watcher is not None:
+            return self._watcher
+
+        def signature():
+            try:
+                return file_signature(self.data_path)
+            except OSError:
+                return None
+
+        loaded = signature()
+
+        def poll():
+            nonlocal loaded
+            previous = loaded
+            while True:
+                time.sleep(interval)
+                current = signature()
+                if current is not None and current == previous and current != loaded:
+                    if self.reload():
+                        loaded = current
+                previous = current
+
+        self._watcher = threading.Thread(target=poll, name='dataset-watcher', daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def snapshot_options(self):
+        """Load options that change what a snapshot contains"""
+        return {'compact': self.compact}
+
+    def load_snapshot(self):
+        """Load the preprocessed snapshot if it is up to date with the data file"""
+        try:
+            # Parsed once, both to check freshness and to put the snapshot back together
+            manifest = self.snapshot.read_manifest()
+            if not self.snapshot.is_fresh(self.data_path, self.snapshot_options(), manifest):
+                return None
+            df, cube_state, index_state = self.snapshot.load(manifest, mmap_mode='r' if self.memory_map else None)
+        except Exception as e:
+            print(f"Error loading snapshot: {e}")
+            return None
+
+        cube = AggregateCube.from_arrays(*cube_state) if cube_state else None
+        index = InvertedIndex.from_arrays(*index_state) if index_state else self.build_index(df)
+        source = 'memory-mapped snapshot' if self.memory_map else 'snapshot'
+        detector = self.detector.restore(manifest.get('detector')) or self.build_detector(df)
+        print(f"Data loaded from {source}: {df.shape[0]} rows, {df.shape[1]} columns")
+        return DatasetState(df, cube, index, detector=detector, source=manifest['source'])
+
+    def save_snapshot(self, state):
+        """Write a preprocessed snapshot next to the data file for faster restarts"""
+        try:
+            extra_columns = {}
+            if self.compact and 'comments' not in state.columns:
+                extra_columns['comments'] = self.read_comments(state)
+            self.snapshot.save(
+                self.data_path, self.snapshot_options(), state.df,
+                cube=state.cube, index=state.index, extra_columns=extra_columns, detector=state.detector,
+                source=state.source
+            )
+            print(f"Snapshot written to {self.snapshot.path}")
+        except Exception as e:
+            print(f"Error writing snapshot: {e}")
+
+    def read_csv(self, **kwargs):
+        """Read the data file, leaving lazy columns out in compact mode"""
+        if self.compact:
+            # Free-text columns are loaded on demand by get_comments
+            return pd.read_csv(
+                self.data_path,
+                usecols=lambda column: column not in self.LAZY_COLUMNS,
+                dtype={column: 'category' for column in self.CATEGORY_COLUMNS},
+                **kwargs
+            )
+        return pd.read_csv(self.data_path, **kwargs)
+
+    def read_chunked(self):
+        """Read the data file in chunks, deriving and compacting each chunk as it arrives
+
+        Only one chunk is held raw at a time, but the compact chunks and the
+        frame stacked from them coexist at the end, so memory peaks near twice
+        the compact frame: well below reading the file in one go, not below
+        the frame itself.
+        """
+        chunks = []
+        for chunk in self.read_csv(chunksize=self.chunk_size):
+            chunks.append(self.prepare_frame(chunk))
+
+        if not chunks:
+            return self.prepare_frame(self.read_csv())
+
+        return self.concat_frames(chunks)
+
+    @staticmethod
+    def concat_frames(frames, used_categories=False):
+        """Stack frames with the same columns, merging category dictionaries (or only their used categories)"""
+        columns = {}
+        for column in frames[0].columns:
+            parts = [frame[column] for frame in frames]
+            if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+                if used_categories:
+                    parts = [part.cat.remove_unused_categories() for part in parts]
+                # Frames see different category sets, so merge the dictionaries
+                columns[column] = pd.Series(union_categoricals(parts, sort_categories=True), name=column)
+            else:
+                columns[column] = pd.concat(parts, ignore_index=True)
+        return pd.DataFrame(columns)
+
+    def prepare_frame(self, df):
+        """Parse timestamps and add the derived columns to freshly read rows
+
+        This is the only place rows are modified; once loaded, every request
+        reads the frame and its derived columns without writing to them.
+        """
+        # Ensure proper data types
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            df['year'] = df['timestamp'].dt.year
+            df['month'] = df['timestamp'].dt.month
+            df['day_name'] = df['timestamp'].dt.day_name()
+            df['hour'] = df['timestamp'].dt.hour
+            df['time_of_day'] = time_of_day(df['hour'])
+            df['month_year'] = month_year(df['timestamp'])
+            # Integer day codes from which trend periods are derived without touching dates again
+            df['day_code'] = day_codes(df['timestamp'])
+        
+        # Categorize satisfaction scores
+        if 'satisfaction_score' in df.columns:
+            df['satisfaction_category'] = satisfaction_category(df['satisfaction_score'])
+
+        if self.compact:
+            df = self.compact_columns(df)
+        return df
+
+    def compact_columns(self, df):
+        """Convert text columns to categoricals and scores/dates to small integers"""
+        for column in self.CATEGORY_COLUMNS + self.DERIVED_CATEGORY_COLUMNS:
+            if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+
+        for column, dtype in self.SMALL_INT_COLUMNS.items():
+            if column in df.columns:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    def get_comments(self):
+        """Comments column, read from the data file on first use in compact mode"""
+        state = self.state
+        if 'comments' in state.columns:
+            return state.take(columns=['comments'])['comments']
+
+        if state.comments is None:
+            if state.base_comments is None:
+                state.base_comments = self.read_comments(state)
+            parts = [state.base_comments] + [comments for _, comments in state.appended if comments is not None]
+            state.comments = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        return state.comments
+
+    def read_comments(self, state):
+        """Comments of a state's rows read from the data file
+
+        They come from the snapshot or the file the rows were loaded from. If
+        that file has changed since, the comments no longer line up with the
+        rows: a reload is started and SourceChangedError raised instead.
+        """
+        missing = pd.Series(np.nan, index=pd.RangeIndex(state.base_rows), name='comments', dtype=object)
+        if state.source is None:
+            # Sample data has no comments
+            return missing
+
+        if self.snapshot is not None:
+            try:
+                comments = self.snapshot.load_extra_column('comments', source=state.source)
+                if comments is not None:
+                    return comments
+            except (OSError, ValueError):
+                pass
+
+        try:
+            comments = pd.read_csv(self.data_path, usecols=['comments'])['comments']
+        except ValueError:
+            # The file has no comments column
+            comments = missing
+        except OSError:
+            comments = None
+        # Checked after reading, so a change during the read is caught too
+        if comments is None or len(comments) != state.base_rows or not source_unchanged(state.source, self.data_path):
+            self.reload(background=True)
+            raise SourceChangedError("the data file changed since the dataset was loaded; it is being reloaded")
+        return comments
+
+    def get_distinct_values(self, column):
+        """Sorted distinct non-missing values of a column"""
+        if not self.has_column(column):
+            return []
+        state = self.state
+        if state.storage is not None:
+            return state.storage.distinct(column)
+        return sorted({str(value) for frame in state.frames for value in frame[column].dropna().unique()})
+
+    def build_cube(self, df):
+        """Build the aggregate cube used to answer summary queries"""
+        try:
+            cube = self.aggregate_frame(df)
+            print(f"Aggregate cube built: {len(cube.rows)} cells")
+            return cube
+        except Exception as e:
+            # Fall back to scanning rows on every request
+            print(f"Aggregate cube unavailable: {e}")
+            return None
+
+    def aggregate_frame(self, df):
+        """Aggregate rows into a cube, across worker processes when sharding pays off"""
+        if self.shards and len(df) >= MIN_SHARD_ROWS:
+            return build_cube_sharded(df, self.shards, self.shard_by)
+        return AggregateCube.from_frame(df)
+
+    def build_index(self, df):
+        """Build the inverted indexes used to answer filters"""
+        return InvertedIndex.from_frame(df)
+
+    def build_detector(self, df):
+        """Run every loaded rating through the drop detector, in timestamp order"""
+        return self.detector.update(df)
+
+    def validate_rating(self, record):
+        """Check one new rating and return it as a row of SOURCE_COLUMNS"""
+        if not isinstance(record, dict):
+            raise ValueError("each rating must be a JSON object")
+
+        row = {}
+        for field in self.REQUIRED_FIELDS:
+            if record.get(field) in (None, ''):
+                raise ValueError(f"missing required field '{field}'")
+
+        for field in ['student_id', 'academic_year', 'major', 'facility_rated']:
+            if not isinstance(record[field], str) or not record[field].strip():
+                raise ValueError(f"'{field}' must be a non-empty string")
+            row[field] = record[field].strip()
+
+        score = record['satisfaction_score']
+        try:
+            if isinstance(score, bool):
+                raise ValueError
+            score = float(score)
+        except (TypeError, ValueError):
+            raise ValueError("'satisfaction_score' must be a number")
+        if not score.is_integer() or not SCORE_VALUES[0] <= score <= SCORE_VALUES[-1]:
+            raise ValueError(f"'satisfaction_score' must be an integer from {SCORE_VALUES[0]} to {SCORE_VALUES[-1]}")
+        row['satisfaction_score'] = score
+
+        try:
+            timestamp = pd.Timestamp(record['timestamp']) if record.get('timestamp') else pd.Timestamp.now().floor('s')
+        except (TypeError, ValueError):
+            raise ValueError("'timestamp' must be a date and time")
+        if pd.isna(timestamp):
+            raise ValueError("'timestamp' must be a date and time")
+        if timestamp.tz is not None:
+            # Loaded timestamps are naive, so times with an offset are stored as naive UTC
+            timestamp = timestamp.tz_convert(None)
+        row['timestamp'] = timestamp
+
+        comments = record.get('comments')
+        if comments is not None and not isinstance(comments, str):
+            raise ValueError("'comments' must be a string")
+        row['comments'] = comments or np.nan
+        return row
+
+    def append(self, records):
+        """Add new ratings without reloading the data file
+
+        The new rows are derived like loaded ones and folded into the cube and
+        indexes as a small batch; they join the frame itself on next access.
+        Returns the number of ratings appended and the number of rows once
+        they are, read off the state they were appended to.
+        """
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list):
+            raise ValueError("expected a rating object or a list of ratings")
+
+        rows = []
+        for position, record in enumerate(records):
+            try:
+                rows.append(self.validate_rating(record))
+            except ValueError as e:
+                raise ValueError(f"rating {position}: {e}")
+        if not rows:
+            return 0, self.num_rows
+
+        frame = pd.DataFrame(rows, columns=self.SOURCE_COLUMNS)
+        # Compact states keep comments beside the frame; storage keeps them in the rows
+        comments = frame.pop('comments') if self.compact and self.storage is None else None
+        frame = self.prepare_frame(frame)
+
+        with self._lock:
+            if self._state.storage is not None:
+                # Committed to disk, so the ratings survive restarts and reloads
+                detector = self._state.detector.update(frame)
+                self._state.storage.append(frame, meta={'detector': detector.to_state()})
+                state = DatasetState.over_storage(self._state.storage, detector)
+            else:
+                state = self._with_batch(self._state, frame, comments)
+            self._swap(state)
+        return len(frame), state.num_rows
+
+    def _with_batch(self, state, frame, comments):
+        """New state with a batch of prepared rows added to a state's rows, cube and indexes"""
+        frame = frame.reindex(columns=state.columns)
+        cube = state.cube.merge(AggregateCube.from_frame(frame)) if state.cube is not None else None
+        index = state.index.extend(frame, state.num_rows)
+        detector = state.detector.update(frame) if state.detector is not None else None
+        return state.with_batch(frame, comments, cube, index, state.version, detector)
     
     def create_sample_data(self):
         """Create sample data if file not found"""
@@ -49,178 +723,372 @@ class DataProcessor:
             'timestamp': pd.date_range(start='2021-01-01', periods=num_entries, freq='h'),
         }
         
-        self.df = pd.DataFrame(data)
-        print(f"Sample data created: {self.df.shape[0]} rows")
-    
-    def get_overall_metrics(self):
+        df = pd.DataFrame(data)
+        print(f"Sample data created: {df.shape[0]} rows")
+        return df
+
+    @timed_section('summarize')
+    def summarize(self, filters=None, dimensions=AggregateCube.DIMENSIONS):
+        """Totals and group statistics for the rows matching the filters, in one pass
+
+        Answered from the aggregate cube when there is one, otherwise from a cube
+        built over the matching rows. Returns None when the scores can't be
+        binned, in which case the calculate_*_from_df methods are used instead.
+        """
+        state = self.state
+        if state.storage is not None:
+            summary = state.storage.summarize(filters, dimensions)
+            rows_scanned.inc(summary.totals['rows'], source='storage')
+            return summary
+        cube = self.cube
+        if cube is not None:
+            rows_scanned.inc(len(cube.rows), source='cube')
+            return cube.summarize(filters, dimensions)
+        try:
+            df = self.get_filtered_frame(filters)
+            rows_scanned.inc(len(df), source='frame')
+            return self.aggregate_frame(df).summarize(dimensions=dimensions)
+        except ValueError:
+            return None
+
+    @timed_section('overall_metrics')
+    def get_overall_metrics(self, filters=None, summary=None):
         """Calculate overall metrics"""
-        if self.df is None or self.df.empty:
+        if not self.has_data():
             return {}
-        
-        total_ratings = len(self.df)
-        avg_score = self.df['satisfaction_score'].mean()
-        median_score = self.df['satisfaction_score'].median()
-        std_score = self.df['satisfaction_score'].std()
-        
+
+        summary = summary or self.summarize(filters, dimensions=())
+        if summary is None:
+            return self.calculate_overall_metrics_from_df(self.get_filtered_frame(filters))
+
+        totals = summary.totals
+        hist = totals['hist']
+        count = totals['count']
+        avg_score = totals['sum'] / count if count else np.nan
+        std_score = np.sqrt(max(totals['sumsq'] - totals['sum'] * avg_score, 0) / (count - 1)) if count > 1 else np.nan
+
         # Score distribution
-        score_counts = self.df['satisfaction_score'].value_counts().sort_index()
         score_distribution = {
-            str(score): int(count) for score, count in score_counts.items()
+            str(float(score)): int(n) for score, n in zip(SCORE_VALUES, hist) if n > 0
         }
-        
-        # Category distribution
-        if 'satisfaction_category' in self.df.columns:
-            category_counts = self.df['satisfaction_category'].value_counts()
-            category_distribution = {
-                category: int(count) for category, count in category_counts.items()
-            }
-        else:
-            category_distribution = {}
-        
+
+        # Category distribution (rows without a score fall through to High)
+        categories = {
+            'Low': int(hist[SCORE_VALUES <= 2].sum()),
+            'Medium': int(hist[SCORE_VALUES == 3].sum()),
+            'High': int(hist[SCORE_VALUES > 3].sum()) + totals['null_scores']
+        }
+        category_distribution = {category: n for category, n in categories.items() if n > 0}
+
         return {
-            'total_ratings': int(total_ratings),
+            'total_ratings': totals['rows'],
             'average_score': float(round(avg_score, 2)),
-            'median_score': float(round(median_score, 2)),
+            'median_score': float(round(histogram_median(hist), 2)),
             'std_deviation': float(round(std_score, 2)),
             'score_distribution': score_distribution,
             'category_distribution': category_distribution,
             'date_range': {
-                'start': str(self.df['timestamp'].min()) if 'timestamp' in self.df.columns else None,
-                'end': str(self.df['timestamp'].max()) if 'timestamp' in self.df.columns else None
+                'start': str(totals['start']) if self.has_column('timestamp') else None,
+                'end': str(totals['end']) if self.has_column('timestamp') else None
             }
         }
-    
-    def get_facility_metrics(self):
+
+    @timed_section('facility_metrics')
+    def get_facility_metrics(self, filters=None, summary=None, columnar=False):
         """Calculate facility-wise metrics"""
-        if self.df is None or self.df.empty:
-            return []
-        
-        facility_stats = self.df.groupby('facility_rated').agg({
-            'satisfaction_score': ['count', 'mean', 'std', 'min', 'max']
-        }).round(2)
-        
-        # Flatten column names
-        facility_stats.columns = ['_'.join(col).strip() for col in facility_stats.columns.values]
-        
-        # Convert to list of dictionaries
-        facilities = []
-        for facility, row in facility_stats.iterrows():
-            facilities.append({
-                'facility': str(facility),
-                'total_ratings': int(row['satisfaction_score_count']),
-                'average_score': float(row['satisfaction_score_mean']),
-                'std_deviation': float(row['satisfaction_score_std']),
-                'min_score': float(row['satisfaction_score_min']),
-                'max_score': float(row['satisfaction_score_max']),
-                'rank': 0  # Will be updated after sorting
-            })
-        
-        # Sort by average score and assign ranks
-        facilities.sort(key=lambda x: x['average_score'], reverse=True)
-        for i, facility in enumerate(facilities, 1):
-            facility['rank'] = i
-        
-        return facilities
-    
-    def get_year_metrics(self):
+        if not self.has_data():
+            return self._shape_empty('facility', columnar, [])
+
+        summary = summary or self.summarize(filters, dimensions=['facility_rated'])
+        if summary is None:
+            return self.calculate_facility_metrics_from_df(self.get_filtered_frame(filters), columnar)
+
+        return self._facility_metrics(summary['facility_rated'], columnar)
+
+    @timed_section('year_metrics')
+    def get_year_metrics(self, filters=None, summary=None, columnar=False):
         """Calculate year-wise metrics"""
-        if self.df is None or self.df.empty or 'academic_year' not in self.df.columns:
-            return []
-        
-        year_stats = self.df.groupby('academic_year').agg({
-            'satisfaction_score': ['count', 'mean', 'std']
-        }).round(2)
-        
-        years = []
-        for year, row in year_stats.iterrows():
-            years.append({
-                'academic_year': str(year),
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')]),
-                'std_deviation': float(row[('satisfaction_score', 'std')])
-            })
-        
-        return years
-    
-    def get_major_metrics(self):
+        if not self.has_data() or not self.has_column('academic_year'):
+            return self._shape_empty('academic_year', columnar, [])
+
+        summary = summary or self.summarize(filters, dimensions=['academic_year'])
+        if summary is None:
+            return self.calculate_year_metrics_from_df(self.get_filtered_frame(filters), columnar)
+
+        return self._year_metrics(summary['academic_year'], columnar)
+
+    @timed_section('major_metrics')
+    def get_major_metrics(self, filters=None, summary=None, columnar=False):
         """Calculate major-wise metrics"""
-        if self.df is None or self.df.empty or 'major' not in self.df.columns:
-            return []
-        
-        major_stats = self.df.groupby('major').agg({
-            'satisfaction_score': ['count', 'mean', 'std']
-        }).round(2)
-        
-        majors = []
-        for major, row in major_stats.iterrows():
-            majors.append({
-                'major': str(major),
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')]),
-                'std_deviation': float(row[('satisfaction_score', 'std')])
-            })
-        
-        # Sort by total ratings
-        majors.sort(key=lambda x: x['total_ratings'], reverse=True)
-        return majors[:10]  # Return top 10 only
-    
-    def get_time_metrics(self):
+        if not self.has_data() or not self.has_column('major'):
+            return self._shape_empty('major', columnar, [])
+
+        summary = summary or self.summarize(filters, dimensions=['major'])
+        if summary is None:
+            return self.calculate_major_metrics_from_df(self.get_filtered_frame(filters), columnar)
+
+        return self._major_metrics(summary['major'], columnar)
+
+    @timed_section('time_metrics')
+    def get_time_metrics(self, filters=None, summary=None, columnar=False):
         """Calculate time-based metrics"""
-        if self.df is None or self.df.empty or 'hour' not in self.df.columns:
-            return {}
-        
-        # Time of day categories
-        def categorize_time(hour):
-            if 5 <= hour < 12:
-                return 'Morning'
-            elif 12 <= hour < 17:
-                return 'Afternoon'
-            elif 17 <= hour < 22:
-                return 'Evening'
+        if not self.has_data() or not self.has_column('hour'):
+            return self._shape_empty('time_of_day', columnar, {})
+
+        summary = summary or self.summarize(filters, dimensions=['time_of_day'])
+        if summary is None:
+            return self.calculate_time_metrics_from_df(self.get_filtered_frame(filters), columnar)
+
+        return self._time_metrics(summary['time_of_day'], columnar)
+
+    def _facility_metrics(self, stats, columnar=False):
+        """Facility metrics from per-facility count/mean/std/min/max statistics"""
+        # Sort by average score and assign ranks
+        stats = stats.round(2).sort_values('mean', ascending=False, kind='stable')
+        columns = frame_columns(stats.astype({'count': np.int64}), {
+            'facility': None,
+            'total_ratings': 'count',
+            'average_score': 'mean',
+            'std_deviation': 'std',
+            'min_score': 'min',
+            'max_score': 'max'
+        })
+        columns['rank'] = list(range(1, len(stats) + 1))
+        return self._shape(columns, 'facility', columnar)
+
+    def _year_metrics(self, stats, columnar=False):
+        """Year metrics from per-year count/mean/std statistics"""
+        columns = frame_columns(stats.round(2).astype({'count': np.int64}), {
+            'academic_year': None,
+            'total_ratings': 'count',
+            'average_score': 'mean',
+            'std_deviation': 'std'
+        })
+        return self._shape(columns, 'academic_year', columnar)
+
+    def _major_metrics(self, stats, columnar=False):
+        """Major metrics from per-major count/mean/std statistics"""
+        # Sort by total ratings and keep the top 10 only
+        stats = stats.round(2).sort_values('count', ascending=False, kind='stable').head(10)
+        columns = frame_columns(stats.astype({'count': np.int64}), {
+            'major': None,
+            'total_ratings': 'count',
+            'average_score': 'mean',
+            'std_deviation': 'std'
+        })
+        return self._shape(columns, 'major', columnar)
+
+    def _time_metrics(self, stats, columnar=False):
+        """Time of day metrics from per-bucket count/mean statistics"""
+        columns = frame_columns(stats.round(2).astype({'count': np.int64}), {
+            'time_of_day': None,
+            'total_ratings': 'count',
+            'average_score': 'mean'
+        })
+        if columnar:
+            return self._shape(columns, 'time_of_day', columnar)
+
+        return {
+            str(time): {'total_ratings': count, 'average_score': score}
+            for time, count, score in zip(columns['time_of_day'], columns['total_ratings'], columns['average_score'])
+        }
+
+    @staticmethod
+    def _shape(columns, label, columnar):
+        """Metrics as a list of rows, or as {'labels': [...], <metric>: [...]} columns for charts"""
+        if not columnar:
+            return columns_to_records(columns)
+        shaped = {'labels': columns.pop(label)}
+        shaped.update(columns)
+        return shaped
+
+    @classmethod
+    def empty_columns(cls, label):
+        """Columnar shape of a breakdown without groups, with every metric as an empty list"""
+        shaped = {'labels': []}
+        shaped.update({metric: [] for metric in cls.GROUP_METRICS[label]})
+        return shaped
+
+    @classmethod
+    def _shape_empty(cls, label, columnar, empty):
+        return cls.empty_columns(label) if columnar else empty
+    
+    @timed_section('percentiles')
+    def get_score_percentiles(self, by='facility', percentiles=(10, 25, 50, 75, 90), filters=None, summary=None):
+        """Exact median, quartiles, percentiles and std of scores per facility, year or major"""
+        if by not in self.PERCENTILE_GROUPS:
+            raise ValueError(f"'by' must be one of {', '.join(self.PERCENTILE_GROUPS)}")
+        percentiles = [float(p) for p in percentiles]
+        if any(not 0 <= p <= 100 for p in percentiles):
+            raise ValueError("percentiles must be between 0 and 100")
+
+        dimension = self.PERCENTILE_GROUPS[by]
+        if not self.has_data() or not self.has_column(dimension):
+            return []
+
+        summary = summary or self.summarize(filters, dimensions=[dimension])
+        if summary is None:
+            return self.calculate_score_percentiles_from_df(self.get_filtered_frame(filters), by, percentiles)
+
+        stats = summary[dimension]
+        stats = stats[stats['count'] > 0]
+        hist = stats[HIST_COLUMNS].to_numpy()
+        quartiles = histogram_percentiles(hist, [25, 50, 75])
+        values = histogram_percentiles(hist, percentiles)
+
+        groups = []
+        for position, (label, count, mean, std) in enumerate(zip(
+                stats.index, stats['count'].tolist(), stats['mean'].tolist(), stats['std'].tolist())):
+            groups.append(self._percentile_row(
+                by, label, count, mean, std, quartiles[position], dict(zip(percentiles, values[position]))
+            ))
+        return groups
+
+    @timed_section('trend_series')
+    def get_trends(self, granularity='month', by=None, window=None, filters=None):
+        """Mean score per day, week, month or semester, overall or per facility, year or major
+
+        Matching rows are reduced to (group, day) statistics using the day codes
+        computed at load, then rolled up into periods; window adds the mean over
+        each period and the window - 1 before it.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if by is not None and by not in self.TREND_GROUPS:
+            raise ValueError(f"'by' must be one of {', '.join(self.TREND_GROUPS)}")
+        if window is not None and window < 1:
+            raise ValueError("window must be a positive number of periods")
+
+        column = self.TREND_GROUPS.get(by)
+        state = self.state
+        if state.storage is not None:
+            days, groups, counts, sums, labels = state.storage.daily_stats(filters, column)
+        elif not self.has_data() or not self.has_column('day_code'):
+            days = groups = counts = sums = np.zeros(0, dtype=np.int64)
+            labels = []
+        else:
+            # Only the matching rows of the needed columns are copied out of the loaded and appended rows
+            df = state.take(self.select_rows(filters), ['day_code', 'satisfaction_score'] + ([column] if column else []))
+            days = df['day_code'].to_numpy()
+            scores = pd.to_numeric(df['satisfaction_score'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            if column is None:
+                codes, labels = np.zeros(len(df), dtype=np.int32), ['All']
+            elif isinstance(df[column].dtype, pd.CategoricalDtype):
+                codes, labels = df[column].cat.codes.to_numpy(), [str(label) for label in df[column].cat.categories]
             else:
-                return 'Night'
-        
-        self.df['time_of_day'] = self.df['hour'].apply(categorize_time)
-        
-        time_stats = self.df.groupby('time_of_day').agg({
-            'satisfaction_score': ['count', 'mean']
-        }).round(2)
-        
-        time_data = {}
-        for time, row in time_stats.iterrows():
-            time_data[str(time)] = {
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')])
-            }
-        
-        return time_data
+                codes, uniques = pd.factorize(df[column], sort=True)
+                labels = [str(label) for label in uniques]
+
+            rows_scanned.inc(len(days), source='trends')
+            days, groups, counts, sums = daily_stats(days, codes, scores)
+
+        return build_trends(days, groups, counts, sums, labels, granularity, window)
+
+    def get_alerts(self, dimension=None):
+        """Facilities and majors whose recent satisfaction dropped well below their baseline"""
+        detector = self.state.detector
+        return detector.alerts(dimension) if detector is not None else []
+
+    @staticmethod
+    def _percentile_row(by, label, count, mean, std, quartiles, percentiles):
+        return {
+            by: str(label),
+            'total_ratings': int(count),
+            'average_score': float(round(mean, 2)),
+            'std_deviation': float(round(std, 2)),
+            'median_score': float(round(quartiles[1], 2)),
+            'quartiles': [float(round(q, 2)) for q in quartiles],
+            'percentiles': {f'{p:g}': float(round(v, 2)) for p, v in percentiles.items()}
+        }
     
-    def get_filtered_data(self, filters):
-        """Get filtered data based on user input"""
-        filtered_df = self.df.copy()
+    def select_rows(self, filters):
+        """Sorted positions of the rows matching the filters, or None for all rows"""
+        return self.index.select(filters)
 
-        # Apply filters
-        if 'facility' in filters and filters['facility']:
-            filtered_df = filtered_df[filtered_df['facility_rated'].str.lower() == filters['facility'].lower()]
+    @timed_section('filter')
+    def get_filtered_frame(self, filters):
+        """Rows matching the filters as a dataframe, keeping the loaded dtypes"""
+        state = self.state
+        if state.storage is not None:
+            return state.storage.read_frame(filters)
+        return state.take(self.select_rows(filters))
 
-        if 'year' in filters and filters['year']:
-            filtered_df = filtered_df[filtered_df['academic_year'].str.lower() == filters['year'].lower()]
+    def get_field_names(self):
+        """Columns a filtered-data row can contain, in output order"""
+        columns = [column for column in self.state.columns if column not in self.INTERNAL_COLUMNS]
+        if 'comments' not in columns and self.compact:
+            # Lazily loaded comments are listed after the timestamp, as in the data file
+            position = columns.index('timestamp') + 1 if 'timestamp' in columns else len(columns)
+            columns.insert(position, 'comments')
+        return columns
 
-        if 'major' in filters and filters['major']:
-            filtered_df = filtered_df[filtered_df['major'].str.lower() == filters['major'].lower()]
+    @timed_section('filter')
+    def select_page(self, filters=None, offset=0, limit=None, cursor=None):
+        """Row ids of one page of matching rows, the total number of matches and the next cursor
 
-        if 'score_range' in filters and filters['score_range']:
-            try:
-                min_score, max_score = map(int, filters['score_range'].split('-'))
-                filtered_df = filtered_df[
-                    (filtered_df['satisfaction_score'] >= min_score) &
-                    (filtered_df['satisfaction_score'] <= max_score)
-                ]
-            except ValueError:
-                # If score_range is not in 'min-max' format, skip the filter
-                pass
+        A cursor is the id of the last row of the previous page. Appended rows
+        always get larger ids, so paging by cursor neither skips nor repeats
+        rows while new ratings arrive. The total is read from the index.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative")
+
+        state = self.state
+        if state.storage is not None:
+            page, total, next_cursor = state.storage.select_page(filters, offset, limit, cursor)
+            rows_scanned.inc(len(page), source='page')
+            return page, total, next_cursor
+
+        rows = self.select_rows(filters)
+        total = self.num_rows if rows is None else len(rows)
+
+        start = 0
+        if cursor is not None:
+            start = cursor + 1 if rows is None else int(np.searchsorted(rows, cursor, side='right'))
+        start = min(start + offset, total)
+        stop = total if limit is None else min(start + limit, total)
+
+        page = range(start, stop) if rows is None else rows[start:stop]
+        rows_scanned.inc(len(page), source='page')
+        next_cursor = int(page[-1]) if stop < total and len(page) else None
+        return page, total, next_cursor
+
+    def iter_filtered_frames(self, page, fields=None, chunk_size=5000):
+        """Yield the rows of a page as frames of at most chunk_size rows holding only the given fields"""
+        available = self.get_field_names()
+        fields = fields or available
+        unknown = [field for field in fields if field not in available]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
 
-        return filtered_df.to_dict('records')
+        state = self.state
+        if state.storage is not None:
+            return state.storage.iter_frames(page, fields, chunk_size)
+
+        comments = None
+        if 'comments' in fields and 'comments' not in state.columns:
+            comments = self.get_comments().to_numpy()
+        stored = [field for field in fields if field in state.columns]
+
+        def frames():
+            for start in range(0, len(page), chunk_size):
+                ids = np.asarray(page[start:start + chunk_size])
+                chunk = state.take(ids, stored).reset_index(drop=True)
+                columns = {}
+                for field in fields:
+                    columns[field] = chunk[field] if field in state.columns else pd.Series(comments[ids], dtype=object)
+                yield pd.DataFrame(columns, copy=False)
+
+        # Validate before the first chunk is requested
+        return frames()
+
+    def get_filtered_data(self, filters, fields=None, offset=0, limit=None, cursor=None):
+        """Get filtered data based on user input"""
+        page, _, _ = self.select_page(filters, offset, limit, cursor)
+        records = []
+        for chunk in self.iter_filtered_frames(page, fields):
+            records.extend(frame_to_records(chunk))
+        return records
 
     def calculate_overall_metrics_from_df(self, df):
         """Calculate overall metrics from a given dataframe"""
@@ -243,12 +1111,13 @@ class DataProcessor:
         # Score distribution
         score_counts = df['satisfaction_score'].value_counts().sort_index()
         score_distribution = {
-            str(score): int(count) for score, count in score_counts.items()
+            str(float(score)): int(count) for score, count in score_counts.items()
         }
 
         # Category distribution
         if 'satisfaction_category' in df.columns:
             category_counts = df['satisfaction_category'].value_counts()
+            category_counts = category_counts[category_counts > 0]
             category_distribution = {
                 category: int(count) for category, count in category_counts.items()
             }
@@ -268,108 +1137,73 @@ class DataProcessor:
             }
         }
 
-    def calculate_facility_metrics_from_df(self, df):
+    def calculate_facility_metrics_from_df(self, df, columnar=False):
         """Calculate facility metrics from a given dataframe"""
         if df is None or df.empty or 'facility_rated' not in df.columns:
-            return []
-
-        facility_stats = df.groupby('facility_rated').agg({
-            'satisfaction_score': ['count', 'mean', 'std', 'min', 'max']
-        }).round(2)
-
-        # Flatten column names
-        facility_stats.columns = ['_'.join(col).strip() for col in facility_stats.columns.values]
-
-        # Convert to list of dictionaries
-        facilities = []
-        for facility, row in facility_stats.iterrows():
-            facilities.append({
-                'facility': str(facility),
-                'total_ratings': int(row['satisfaction_score_count']),
-                'average_score': float(row['satisfaction_score_mean']),
-                'std_deviation': float(row['satisfaction_score_std']),
-                'min_score': float(row['satisfaction_score_min']),
-                'max_score': float(row['satisfaction_score_max']),
-                'rank': 0  # Will be updated after sorting
-            })
+            return self._shape_empty('facility', columnar, [])
 
-        # Sort by average score and assign ranks
-        facilities.sort(key=lambda x: x['average_score'], reverse=True)
-        for i, facility in enumerate(facilities, 1):
-            facility['rank'] = i
-
-        return facilities
+        facility_stats = df.groupby('facility_rated', observed=True)['satisfaction_score'].agg(
+            ['count', 'mean', 'std', 'min', 'max']
+        ).astype(float)
+        return self._facility_metrics(facility_stats, columnar)
 
-    def calculate_year_metrics_from_df(self, df):
+    def calculate_year_metrics_from_df(self, df, columnar=False):
         """Calculate year metrics from a given dataframe"""
         if df is None or df.empty or 'academic_year' not in df.columns:
-            return []
-
-        year_stats = df.groupby('academic_year').agg({
-            'satisfaction_score': ['count', 'mean', 'std']
-        }).round(2)
+            return self._shape_empty('academic_year', columnar, [])
 
-        years = []
-        for year, row in year_stats.iterrows():
-            years.append({
-                'academic_year': str(year),
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')]),
-                'std_deviation': float(row[('satisfaction_score', 'std')])
-            })
+        year_stats = df.groupby('academic_year', observed=True)['satisfaction_score'].agg(
+            ['count', 'mean', 'std']
+        ).astype(float)
+        return self._year_metrics(year_stats, columnar)
 
-        return years
-
-    def calculate_major_metrics_from_df(self, df):
+    def calculate_major_metrics_from_df(self, df, columnar=False):
         """Calculate major metrics from a given dataframe"""
         if df is None or df.empty or 'major' not in df.columns:
-            return []
-
-        major_stats = df.groupby('major').agg({
-            'satisfaction_score': ['count', 'mean', 'std']
-        }).round(2)
+            return self._shape_empty('major', columnar, [])
 
-        majors = []
-        for major, row in major_stats.iterrows():
-            majors.append({
-                'major': str(major),
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')]),
-                'std_deviation': float(row[('satisfaction_score', 'std')])
-            })
+        major_stats = df.groupby('major', observed=True)['satisfaction_score'].agg(
+            ['count', 'mean', 'std']
+        ).astype(float)
+        return self._major_metrics(major_stats, columnar)
 
-        # Sort by total ratings
-        majors.sort(key=lambda x: x['total_ratings'], reverse=True)
-        return majors[:10]  # Return top 10 only
-
-    def calculate_time_metrics_from_df(self, df):
+    def calculate_time_metrics_from_df(self, df, columnar=False):
         """Calculate time metrics from a given dataframe"""
         if df is None or df.empty or 'hour' not in df.columns:
-            return {}
+            return self._shape_empty('time_of_day', columnar, {})
 
-        # Time of day categories
-        def categorize_time(hour):
-            if 5 <= hour < 12:
-                return 'Morning'
-            elif 12 <= hour < 17:
-                return 'Afternoon'
-            elif 17 <= hour < 22:
-                return 'Evening'
-            else:
-                return 'Night'
+        if 'time_of_day' in df.columns:
+            time_of_day_column = df['time_of_day']
+        else:
+            time_of_day_column = time_of_day(df['hour'])
 
-        df_copy = df.copy()
-        df_copy['time_of_day'] = df_copy['hour'].apply(categorize_time)
+        time_stats = df.groupby(time_of_day_column, observed=True)['satisfaction_score'].agg(
+            ['count', 'mean']
+        ).astype(float)
+        return self._time_metrics(time_stats, columnar)
 
-        time_stats = df_copy.groupby('time_of_day').agg({
-            'satisfaction_score': ['count', 'mean']
-        }).round(2)
+    def calculate_score_percentiles_from_df(self, df, by, percentiles):
+        """Calculate score percentiles from a given dataframe"""
+        dimension = self.PERCENTILE_GROUPS[by]
+        if df is None or df.empty or dimension not in df.columns:
+            return []
 
-        time_data = {}
-        for time, row in time_stats.iterrows():
-            time_data[str(time)] = {
-                'total_ratings': int(row[('satisfaction_score', 'count')]),
-                'average_score': float(row[('satisfaction_score', 'mean')])
-            }
+        scores = df['satisfaction_score'].astype(float)
+        grouped = scores.groupby(df[dimension], observed=True)
+        quantiles = sorted(set(percentiles) | {25.0, 50.0, 75.0})
+        stats = grouped.agg(['count', 'mean', 'std'])
+        values = grouped.quantile([q / 100 for q in quantiles]).unstack()
+
+        stats = stats[stats['count'] > 0]
+        values = values.loc[stats.index].to_numpy()
 
-        return time_data
+        groups = []
+        for position, (label, count, mean, std) in enumerate(zip(
+                stats.index, stats['count'].tolist(), stats['mean'].tolist(), stats['std'].tolist())):
+            by_percentile = dict(zip(quantiles, values[position]))
+            groups.append(self._percentile_row(
+                by, label, count, mean, std,
+                [by_percentile[q] for q in (25.0, 50.0, 75.0)],
+                {p: by_percentile[p] for p in percentiles}
+            ))
+        return groups
@@ -0,0 +1,125 @@
+import zlib
+import numpy as np
+import pandas as pd
+from .serialization import dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is only offered when pyarrow is installed
+    pa = pq = None
+
+# Export format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+if pq is not None:
+    EXPORT_FORMATS['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def frame_to_records(df):
+    """Rows as JSON-safe dicts, with timestamps as strings and missing values as None"""
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime(DATE_FORMAT)
+        else:
+            values = series.astype(object)
+        # where() keeps NaN in string columns, so missing values are replaced in an object copy
+        values = np.array(values, dtype=object)
+        values[series.isna().to_numpy()] = None
+        columns.append(values.tolist())
+    return [dict(zip(df.columns, row)) for row in zip(*columns)]
+
+
+def ndjson_chunks(frames):
+    """Encode frames of rows as newline-delimited JSON, one chunk per frame"""
+    for frame in frames:
+        yield b''.join(dumps(record, sort_keys=False) + b'\n' for record in frame_to_records(frame))
+
+
+def csv_chunks(frames):
+    """Encode frames of rows as CSV, writing the header with the first chunk"""
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, date_format=DATE_FORMAT).encode()
+        header = False
+
+
+class _ChunkSink:
+    """Write-only file that hands written bytes back in chunks instead of keeping them"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(frames):
+    """Encode frames of rows as a Parquet file, one row group per frame"""
+    if pq is None:
+        raise ValueError("parquet export requires pyarrow")
+
+    sink = _ChunkSink()
+    writer = schema = None
+    for frame in frames:
+        if writer is None:
+            # Columns that are all missing in the first chunk are still text
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            for position, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(position, field.with_type(pa.string()))
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+        yield sink.drain()
+
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(frames, output_format):
+    """Encode frames of rows in an export format"""
+    if output_format == 'csv':
+        return csv_chunks(frames)
+    if output_format == 'ndjson':
+        return ndjson_chunks(frames)
+    if output_format == 'parquet':
+        if pq is None:
+            raise ValueError("parquet export requires pyarrow")
+        return parquet_chunks(frames)
+    raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
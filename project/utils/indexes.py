@@ -0,0 +1,148 @@
+import pandas as pd
+import numpy as np
+
+from .aggregates import parse_score_range
+
+
+def intersect_sorted(small, large):
+    """Intersect two sorted row-id arrays in O(len(small) * log(len(large)))"""
+    if len(small) > len(large):
+        small, large = large, small
+    if len(small) == 0:
+        return small
+    positions = np.searchsorted(large, small)
+    positions[positions == len(large)] = 0
+    return small[large[positions] == small]
+
+
+class InvertedIndex:
+    """Sorted row-id postings for every distinct filter value
+
+    String keys are normalised to lowercase once at build time, so a filter is
+    a dictionary lookup and a multi-filter query is an intersection of a few
+    postings, whose cost follows the number of matching rows.
+    """
+
+    # Filter name -> indexed column
+    COLUMNS = {
+        'facility': 'facility_rated',
+        'year': 'academic_year',
+        'major': 'major',
+    }
+
+    def __init__(self, num_rows, postings, score_postings):
+        self.num_rows = num_rows
+        self.postings = postings
+        self.score_postings = score_postings
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build postings for the filter columns of a dataframe"""
+        postings = {}
+        for column in cls.COLUMNS.values():
+            if column in df.columns:
+                postings[column] = cls._build_postings(df[column], normalize=True)
+            else:
+                postings[column] = {}
+
+        score_postings = {}
+        if 'satisfaction_score' in df.columns:
+            scores = pd.to_numeric(df['satisfaction_score'], errors='coerce')
+            score_postings = cls._build_postings(scores, normalize=False)
+
+        return cls(len(df), postings, score_postings)
+
+    def extend(self, df, offset):
+        """Add postings for new rows appended at positions offset, offset + 1, ..."""
+        new = InvertedIndex.from_frame(df)
+
+        def combine(postings, additions):
+            combined = dict(postings)
+            for key, rows in additions.items():
+                rows = rows.astype(np.int64) + offset
+                # Appended row ids are larger than any existing one, so postings stay sorted
+                combined[key] = np.concatenate([postings[key], rows]) if key in postings else rows
+            return combined
+
+        postings = {column: combine(self.postings[column], new.postings[column]) for column in self.postings}
+        score_postings = combine(self.score_postings, new.score_postings)
+        return InvertedIndex(offset + len(df), postings, score_postings)
+
+    def to_arrays(self):
+        """Split the index into JSON metadata and flat numpy arrays for persisting"""
+        meta = {'num_rows': self.num_rows, 'keys': {}, 'arrays': []}
+        arrays = {}
+        for name, postings in list(self.postings.items()) + [('satisfaction_score', self.score_postings)]:
+            keys = list(postings)
+            meta['keys'][name] = keys
+            lengths = [len(postings[key]) for key in keys]
+            arrays[f'{name}.offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            arrays[f'{name}.rows'] = np.concatenate([postings[key] for key in keys]) if keys \
+                else np.empty(0, dtype=np.int64)
+        meta['arrays'] = list(arrays)
+        return meta, arrays
+
+    @classmethod
+    def from_arrays(cls, meta, arrays):
+        """Rebuild an index persisted with to_arrays"""
+        def unpack(name):
+            rows, offsets = arrays[f'{name}.rows'], arrays[f'{name}.offsets']
+            return {key: rows[offsets[i]:offsets[i + 1]] for i, key in enumerate(meta['keys'][name])}
+
+        postings = {column: unpack(column) for column in cls.COLUMNS.values()}
+        return cls(meta['num_rows'], postings, unpack('satisfaction_score'))
+
+    @staticmethod
+    def _build_postings(values, normalize):
+        codes, uniques = pd.factorize(values)
+        dtype = np.int32 if len(codes) < np.iinfo(np.int32).max else np.int64
+
+        # A stable sort by code lays out every posting as a sorted run of row ids
+        order = np.argsort(codes, kind='stable').astype(dtype)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        offset = int((codes < 0).sum())
+
+        postings = {}
+        for value, count in zip(uniques, counts):
+            key = str(value).lower() if normalize else float(value)
+            rows = order[offset:offset + count]
+            offset += count
+            if key in postings:
+                # Values that differ only by case share one posting
+                rows = np.union1d(postings[key], rows).astype(dtype)
+            postings[key] = rows
+        return postings
+
+    def lookup(self, column, value):
+        """Row ids whose column equals value, ignoring case"""
+        return self.postings[column].get(str(value).lower(), np.empty(0, dtype=np.int64))
+
+    def score_rows(self, min_score, max_score):
+        """Row ids whose score lies in [min_score, max_score]"""
+        parts = [rows for score, rows in self.score_postings.items() if min_score <= score <= max_score]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def select(self, filters):
+        """Sorted row ids matching the filters, or None when nothing is filtered"""
+        filters = filters or {}
+        candidates = []
+
+        for key, column in self.COLUMNS.items():
+            if filters.get(key):
+                candidates.append(self.lookup(column, filters[key]))
+
+        score_range = parse_score_range(filters.get('score_range'))
+        if score_range is not None:
+            candidates.append(self.score_rows(*score_range))
+
+        if not candidates:
+            return None
+
+        # Intersect the most selective postings first
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for other in candidates[1:]:
+            rows = intersect_sorted(rows, other)
+        return rows
@@ -0,0 +1,247 @@
+import time
+import bisect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+# Latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, list(zip(self.label_names, key)), value
+
+
+class Gauge:
+    """Value read from a callable when the metrics are scraped, or set directly"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read=None):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, [], self.read() if self.read is not None else self.value
+
+
+class CounterFunc(Gauge):
+    """Counter kept elsewhere and read from a callable when the metrics are scraped"""
+
+    kind = 'counter'
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', labels + [('le', _format_value(float(bound)))], cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class MetricsRegistry:
+    """Metrics rendered together in the Prometheus text exposition format
+
+    Values live in this process only; with several workers each one serves
+    its own, which Prometheus sums when the workers are scraped separately.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, read=None):
+        return self.register(Gauge(name, help_text, read))
+
+    def counter_func(self, name, help_text, read):
+        return self.register(CounterFunc(name, help_text, read))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+section_seconds = registry.histogram(
+    'campus_pulse_section_duration_seconds', 'Time spent in one section of request handling', ['section']
+)
+rows_scanned = registry.counter(
+    'campus_pulse_rows_scanned_total', 'Rows, or aggregate cube cells, read to answer queries', ['source']
+)
+dataset_load_seconds = registry.gauge(
+    'campus_pulse_dataset_load_seconds', 'Time the last dataset load or reload took'
+)
+
+
+# ========== PER-REQUEST TIMINGS ==========
+
+class RequestTimings:
+    """Durations of the sections run for one request, in the order they finished"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.entries.append((name, seconds))
+
+    def totals(self):
+        """Total seconds per section name, in order of first appearance"""
+        totals = {}
+        with self._lock:
+            for name, seconds in self.entries:
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self, total=None):
+        """Server-Timing header value with one entry per section, plus the total"""
+        parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.totals().items()]
+        if total is not None:
+            parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+_local = threading.local()
+
+
+def begin_request():
+    """Start collecting section timings for the current thread's request"""
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def end_request():
+    """Stop collecting and return what the current request collected"""
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings
+
+
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+
+def bind(func):
+    """Wrap func so sections it runs in another thread count towards this thread's request"""
+    timings = current_timings()
+
+    def bound(*args, **kwargs):
+        previous = getattr(_local, 'timings', None)
+        _local.timings = timings
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.timings = previous
+    return bound
+
+
+@contextmanager
+def timed(section):
+    """Time a block as a named section of the current request and of the section histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        section_seconds.observe(seconds, section=section)
+        timings = current_timings()
+        if timings is not None:
+            timings.add(section, seconds)
+
+
+def timed_section(section):
+    """Decorator form of timed"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(section):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
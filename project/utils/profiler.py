@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that reports where slow requests spent their time
+
+    While enabled, one background thread samples the stack of every thread
+    that is handling a request, every interval seconds. When a request
+    finishes slower than threshold seconds its samples are printed as the
+    hottest stacks and, if a directory is given, written there in the folded
+    format flame graph tools read. Faster requests just drop their samples,
+    so the cost is one stack walk per running request per interval.
+    """
+
+    def __init__(self, threshold, interval=0.005, directory=None, top=10):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.top = top
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+        self._thread.start()
+
+    def start(self):
+        """Sample the current thread until stop is called"""
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+
+    def bind(self, func):
+        """Wrap func so its samples count towards this thread's request when run in another thread"""
+        samples = self._samples.get(threading.get_ident())
+        if samples is None:
+            return func
+
+        def bound(*args, **kwargs):
+            ident = threading.get_ident()
+            with self._lock:
+                self._samples[ident] = samples
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._samples.pop(ident, None)
+        return bound
+
+    def stop(self, name, seconds):
+        """Stop sampling the current thread and report its samples if the request was slow"""
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if samples and seconds >= self.threshold:
+            self.report(name, seconds, samples)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._samples:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        samples[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame):
+        """Folded stack, outermost call first"""
+        calls = []
+        while frame is not None:
+            code = frame.f_code
+            calls.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(calls))
+
+    def report(self, name, seconds, samples):
+        total = sum(samples.values())
+        print(f"Slow request {name}: {seconds * 1000:.0f} ms, {total} samples")
+        for stack, count in samples.most_common(self.top):
+            # The innermost calls are the ones that matter when reading a log
+            innermost = ' <- '.join(reversed(stack.split(';')[-3:]))
+            print(f"  {count / total:6.1%}  {innermost}")
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_')
+            path = os.path.join(self.directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_name}.folded')
+            with open(path, 'w') as f:
+                for stack, count in samples.items():
+                    f.write(f'{stack} {count}\n')
+            print(f"  folded stacks written to {path}")
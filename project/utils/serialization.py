@@ -0,0 +1,107 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+
+def _default(value):
+    """Encode the numpy and pandas values orjson doesn't handle natively"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return None if pd.isna(value) else str(value)
+    if value is pd.NaT or value is pd.NA:
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _clean(value):
+    """Make a value encodable by the standard library the same way orjson encodes it"""
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, dict):
+        return {str(key): _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    if isinstance(value, (np.generic, np.ndarray, pd.Timestamp, pd.Timedelta)) or value is pd.NaT or value is pd.NA:
+        return _clean(_default(value))
+    return value
+
+
+def dumps(obj, sort_keys=True, indent=None, default=None):
+    """Encode to JSON bytes, with numpy arrays and scalars as plain values and NaN as null
+
+    indent can only be 2 when orjson is installed. default encodes values
+    that neither encoder nor the numpy and pandas handling supports.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default if default is None else _chain(default), option=option)
+    separators = None if indent else (',', ':')
+    return json.dumps(
+        _clean(obj), sort_keys=sort_keys, indent=indent, separators=separators, default=default, allow_nan=False
+    ).encode()
+
+
+def _chain(default):
+    """orjson default trying the numpy and pandas handling before the caller's default"""
+    def encode(value):
+        try:
+            return _default(value)
+        except TypeError:
+            return default(value)
+    return encode
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes responses with orjson when it is installed"""
+
+    # Arguments of json.dumps that dumps() supports; calls with any other go to the standard library
+    SUPPORTED_ARGS = {'sort_keys', 'indent', 'default'}
+
+    def dumps(self, obj, **kwargs):
+        unsupported = set(kwargs) - self.SUPPORTED_ARGS
+        if unsupported or (orjson is not None and kwargs.get('indent') not in (None, 2)):
+            return super().dumps(obj, **kwargs)
+        return dumps(
+            obj, sort_keys=kwargs.get('sort_keys', self.sort_keys), indent=kwargs.get('indent'),
+            default=kwargs.get('default', self.default)
+        ).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Pretty-printed like Flask's provider: when compact is False, or unset in debug mode
+        indent = 2 if self.compact is False or (self.compact is None and self._app.debug) else None
+        with timed('serialize'):
+            body = dumps(obj, sort_keys=self.sort_keys, indent=indent, default=self.default)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def frame_columns(frame, columns):
+    """Columns of a frame as lists of plain values, keyed by output name
+
+    columns maps output names to frame columns; None stands for the index.
+    """
+    return {
+        name: (frame.index if column is None else frame[column]).tolist()
+        for name, column in columns.items()
+    }
+
+
+def columns_to_records(columns):
+    """Turn {name: values} columns into a list of {name: value} rows"""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
@@ -0,0 +1,92 @@
+import multiprocessing
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from .aggregates import AggregateCube
+
+# Below this many rows starting worker processes costs more than it saves
+MIN_SHARD_ROWS = 1000000
+
+# Columns a shard needs to build its part of the cube
+CUBE_COLUMNS = list(AggregateCube.DIMENSIONS) + ['satisfaction_score', 'timestamp', 'hour']
+
+# Frame shared with forked workers, which inherit it instead of receiving a pickled copy
+_shared_frame = None
+
+
+def shard_rows(df, shards, by=None):
+    """Row ids of each shard: equal row ranges, or whole groups of the column by
+
+    Groups are assigned largest first to the shard with the fewest rows so far,
+    so shards stay balanced when group sizes differ.
+    """
+    if by is None or by not in df.columns:
+        bounds = np.linspace(0, len(df), shards + 1).astype(np.int64)
+        return [np.arange(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    codes, uniques = pd.factorize(df[by])
+    # Slot 0 holds the rows with a missing value
+    counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+    loads = np.zeros(shards, dtype=np.int64)
+    shard_of = np.zeros(len(counts), dtype=np.int64)
+    for group in np.argsort(-counts, kind='stable'):
+        shard = int(np.argmin(loads))
+        shard_of[group] = shard
+        loads[shard] += counts[group]
+
+    shard_per_row = shard_of[codes + 1]
+    order = np.argsort(shard_per_row, kind='stable')
+    sizes = np.bincount(shard_per_row, minlength=shards)
+    return [rows for rows in np.split(order, np.cumsum(sizes)[:-1]) if len(rows)]
+
+
+def _build_shared_shard(rows):
+    return AggregateCube.from_frame(_shared_frame.iloc[rows])
+
+
+def merge_cubes(cubes):
+    """Merge partial cubes pairwise into one"""
+    cubes = list(cubes)
+    while len(cubes) > 1:
+        cubes = [
+            cubes[i].merge(cubes[i + 1]) if i + 1 < len(cubes) else cubes[i]
+            for i in range(0, len(cubes), 2)
+        ]
+    return cubes[0]
+
+
+def build_cube_sharded(df, workers, by=None):
+    """Build the aggregate cube from shards of the rows in worker processes, then merge them
+
+    Each shard produces a partial cube of counts, sums, sums of squares and
+    histograms per cell; partial cubes add up exactly, so the merged cube
+    matches one built in a single pass.
+
+    Workers are only forked while the calling thread is the only one, as in
+    the startup load: a fork copies locks other threads may hold, and spawned
+    workers would re-import the app and load the data again. Reloads from a
+    serving process build the cube in-process instead.
+    """
+    global _shared_frame
+
+    columns = [column for column in CUBE_COLUMNS if column in df.columns]
+    frame = df[columns]
+    shards = shard_rows(frame, workers, by)
+    if len(shards) < 2 or threading.active_count() > 1:
+        return AggregateCube.from_frame(frame)
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _shared_frame = frame
+        try:
+            with ProcessPoolExecutor(len(shards), mp_context=multiprocessing.get_context('fork')) as pool:
+                partials = list(pool.map(_build_shared_shard, shards))
+        finally:
+            _shared_frame = None
+    else:
+        # Without fork every worker is sent its own slice of the rows
+        with ProcessPoolExecutor(len(shards)) as pool:
+            partials = list(pool.map(AggregateCube.from_frame, [frame.iloc[rows] for rows in shards]))
+
+    return merge_cubes(partials)
@@ -0,0 +1,255 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+import numpy as np
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; snapshots are then built without locking
+    fcntl = None
+
+SNAPSHOT_VERSION = 6
+MANIFEST_NAME = 'manifest.json'
+
+
+def snapshot_path_for(data_path):
+    """Snapshot directory that sits next to a data file"""
+    root, _ = os.path.splitext(data_path)
+    return root + '.snapshot'
+
+
+class SourceChangedError(RuntimeError):
+    """The data file no longer holds the rows a dataset was loaded from"""
+
+
+def file_signature(path, with_hash=False):
+    """Modification time, size and optionally the SHA-1 of a file"""
+    stat = os.stat(path)
+    signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if with_hash:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        signature['sha1'] = digest.hexdigest()
+    return signature
+
+
+def same_source(signature, other):
+    """Whether two signatures describe the same file content, by hash when both have one"""
+    if 'sha1' in signature and 'sha1' in other:
+        return signature['sha1'] == other['sha1']
+    return signature['mtime_ns'] == other['mtime_ns'] and signature['size'] == other['size']
+
+
+def source_unchanged(signature, path):
+    """Whether the file at path still has the content a signature was taken of"""
+    try:
+        current = file_signature(path)
+    except OSError:
+        return False
+    if current['mtime_ns'] == signature['mtime_ns'] and current['size'] == signature['size']:
+        return True
+    # The file was touched or copied; it is only unchanged if its content is
+    if current['size'] != signature['size'] or 'sha1' not in signature:
+        return False
+    return file_signature(path, with_hash=True)['sha1'] == signature['sha1']
+
+
+class DatasetSnapshot:
+    """Preprocessed binary copy of the loaded dataset
+
+    The snapshot is a directory of .npy files (one or two per column, plus the
+    cube and index arrays) and a small JSON manifest describing how to put
+    them back together. Category dictionaries are fixed-width string arrays,
+    mapped like the codes rather than parsed out of the manifest. It records
+    the signature of the source file so that it is only rebuilt when the
+    source changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock held while a process checks or rebuilds the snapshot"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _file(self, name):
+        return os.path.join(self.path, name + '.npy')
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            return None
+        return manifest
+
+    def is_fresh(self, data_path, options, manifest):
+        """Whether the snapshot with this manifest was built from the current data file with the same options"""
+        if manifest is None or manifest.get('options') != options:
+            return False
+
+        source = manifest['source']
+        if not source_unchanged(source, data_path):
+            return False
+
+        mtime_ns = os.stat(data_path).st_mtime_ns
+        if mtime_ns != source['mtime_ns']:
+            # Remember the new mtime so the next start can skip hashing
+            source['mtime_ns'] = mtime_ns
+            try:
+                with open(os.path.join(self.path, MANIFEST_NAME), 'w') as f:
+                    json.dump(manifest, f)
+            except OSError:
+                pass
+        return True
+
+    # ========== WRITING ==========
+
+    def save(self, data_path, options, df, cube=None, index=None, extra_columns=None, detector=None, source=None):
+        """Write the snapshot to a temporary directory, then move it into place
+
+        source is the signature of the file the rows were read from; the
+        snapshot is not written if the file has changed since.
+        """
+        signature = file_signature(data_path, with_hash=True)
+        if source is not None and not same_source(signature, source):
+            raise SourceChangedError("the data file changed after it was loaded")
+
+        staging = f'{self.path}.tmp-{os.getpid()}'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'source': signature,
+            'options': options,
+            'num_rows': len(df),
+            'columns': [],
+            'extra_columns': [],
+        }
+
+        arrays = {}
+        for column in df.columns:
+            manifest['columns'].append(self._encode_column(column, df[column], arrays))
+        for column, series in (extra_columns or {}).items():
+            manifest['extra_columns'].append(self._encode_column(column, series, arrays))
+
+        if cube is not None:
+            cube_meta, cube_arrays = cube.to_arrays()
+            manifest['cube'] = cube_meta
+            arrays.update({f'cube.{name}': array for name, array in cube_arrays.items()})
+        if index is not None:
+            index_meta, index_arrays = index.to_arrays()
+            manifest['index'] = index_meta
+            arrays.update({f'index.{name}': array for name, array in index_arrays.items()})
+        if detector is not None:
+            manifest['detector'] = detector.to_state()
+
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(staging, self.path)
+
+    @staticmethod
+    def _encode_column(name, series, arrays):
+        dtype = series.dtype
+        meta = {'name': name, 'dtype': str(dtype)}
+
+        if isinstance(dtype, pd.CategoricalDtype):
+            meta['kind'] = 'category'
+            arrays[f'col.{name}.categories'] = np.asarray(dtype.categories.astype(str), dtype=str)
+            arrays[f'col.{name}.codes'] = series.cat.codes.to_numpy()
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(dtype):
+            meta['kind'] = 'nullable'
+            arrays[f'col.{name}.values'] = series.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+            arrays[f'col.{name}.mask'] = series.isna().to_numpy()
+        elif pd.api.types.is_datetime64_dtype(dtype):
+            meta['kind'] = 'datetime'
+            arrays[f'col.{name}.values'] = series.to_numpy().view(np.int64)
+        elif pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            meta['kind'] = 'numeric'
+            arrays[f'col.{name}.values'] = series.to_numpy()
+        else:
+            # Text columns are dictionary-encoded, as pickled objects can't be mapped
+            meta['kind'] = 'text'
+            codes, uniques = pd.factorize(series)
+            arrays[f'col.{name}.categories'] = np.asarray(pd.Index(uniques).astype(str), dtype=str)
+            arrays[f'col.{name}.codes'] = codes.astype(np.int32)
+        return meta
+
+    # ========== READING ==========
+
+    def load(self, manifest, mmap_mode=None):
+        """Read the snapshot with this manifest back, returning the frame and the cube and index states
+
+        With mmap_mode='r' numeric arrays and category codes stay backed by the
+        files, so every process mapping the snapshot shares one copy in the page cache.
+        """
+        columns = {meta['name']: self._decode_column(meta, mmap_mode) for meta in manifest['columns']}
+        df = pd.DataFrame(columns, copy=False)
+
+        cube_state = index_state = None
+        if 'cube' in manifest:
+            cube_state = (manifest['cube'], self._load_group('cube', manifest['cube']['arrays'], mmap_mode))
+        if 'index' in manifest:
+            index_state = (manifest['index'], self._load_group('index', manifest['index']['arrays'], mmap_mode))
+        return df, cube_state, index_state
+
+    def load_extra_column(self, name, source=None, mmap_mode=None):
+        """Read one column stored outside the frame, such as lazily loaded comments
+
+        Returns None if the snapshot has no such column, or was built from
+        another version of the data file than the source signature.
+        """
+        manifest = self.read_manifest()
+        if manifest is None or (source is not None and not same_source(manifest['source'], source)):
+            return None
+        for meta in manifest['extra_columns']:
+            if meta['name'] == name:
+                return self._decode_column(meta, mmap_mode)
+        return None
+
+    def _load_group(self, prefix, names, mmap_mode):
+        return {name: np.load(self._file(f'{prefix}.{name}'), mmap_mode=mmap_mode) for name in names}
+
+    def _decode_column(self, meta, mmap_mode):
+        name, kind = meta['name'], meta['kind']
+
+        if kind == 'category':
+            codes = np.load(self._file(f'col.{name}.codes'), mmap_mode=mmap_mode)
+            categories = np.load(self._file(f'col.{name}.categories'), mmap_mode=mmap_mode)
+            values = pd.Categorical.from_codes(codes, categories=pd.Index(categories))
+        elif kind == 'nullable':
+            values = pd.arrays.IntegerArray(
+                np.load(self._file(f'col.{name}.values'), mmap_mode=mmap_mode),
+                np.load(self._file(f'col.{name}.mask'), mmap_mode=mmap_mode)
+            )
+        elif kind == 'datetime':
+            values = np.load(self._file(f'col.{name}.values'), mmap_mode=mmap_mode).view(meta['dtype'])
+        elif kind == 'numeric':
+            values = np.load(self._file(f'col.{name}.values'), mmap_mode=mmap_mode)
+        else:
+            codes = np.load(self._file(f'col.{name}.codes'))
+            categories = np.load(self._file(f'col.{name}.categories'), mmap_mode=mmap_mode)
+            uniques = np.append(categories.astype(object), np.nan)
+            values = pd.array(uniques[codes], dtype=meta['dtype'])
+        return pd.Series(values, name=name, copy=False)
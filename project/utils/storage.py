@@ -0,0 +1,531 @@
+import json
+import sqlite3
+import itertools
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+from .aggregates import AggregateCube, AggregateSummary, SCORE_VALUES, STAT_COLUMNS, HIST_COLUMNS, finalize_stats, parse_score_range
+from .export import DATE_FORMAT
+from .snapshot import file_signature
+from .trends import MISSING_DAY, day_codes
+
+try:
+    import duckdb
+except ImportError:  # DuckDB is used when installed; SQLite ships with Python
+    duckdb = None
+
+TABLE = 'ratings'
+
+# Stored columns and their SQL types, in output order
+COLUMNS = {
+    'student_id': 'TEXT',
+    'academic_year': 'TEXT',
+    'major': 'TEXT',
+    'facility_rated': 'TEXT',
+    'satisfaction_score': 'DOUBLE',
+    'timestamp': 'TEXT',
+    'comments': 'TEXT',
+    'year': 'INTEGER',
+    'month': 'INTEGER',
+    'day_name': 'TEXT',
+    'hour': 'INTEGER',
+    'time_of_day': 'TEXT',
+    'month_year': 'TEXT',
+    'satisfaction_category': 'TEXT',
+    'day_code': 'INTEGER',
+}
+INTEGER_COLUMNS = [column for column, kind in COLUMNS.items() if kind == 'INTEGER']
+
+# Filter name -> column, matched case-insensitively through an index on lower(column)
+FILTER_COLUMNS = {'facility': 'facility_rated', 'year': 'academic_year', 'major': 'major'}
+
+# Where a row came from: the data file, which is replaced on reload, or the ratings API
+SOURCE_FILE = 'file'
+SOURCE_API = 'api'
+
+_SCORE = '"satisfaction_score"'
+_STATS_SQL = ', '.join(
+    ['COUNT(*)', f'COUNT({_SCORE})', f'SUM({_SCORE})', f'SUM({_SCORE} * {_SCORE})', f'MIN({_SCORE})', f'MAX({_SCORE})']
+    + [f'SUM(CASE WHEN {_SCORE} = {score} THEN 1 ELSE 0 END)' for score in SCORE_VALUES]
+)
+
+
+def _quote(column):
+    return f'"{column}"'
+
+
+def _python_rows(frame):
+    """Rows of a frame as tuples of COLUMNS values, with timestamps as text and missing values as None"""
+    columns = []
+    for column in COLUMNS:
+        if column not in frame.columns:
+            columns.append([None] * len(frame))
+            continue
+        series = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime(DATE_FORMAT)
+        else:
+            values = series.astype(object)
+        columns.append(values.where(series.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+class StoragePage:
+    """Ids of one page of matching rows, with the filters that selected them
+
+    The page keeps the read snapshot its ids were selected in, and its rows
+    are read from that same snapshot; it is closed once they have been read.
+    """
+
+    def __init__(self, ids, filters, snapshot=None):
+        self.ids = ids
+        self.filters = filters
+        self.snapshot = snapshot
+
+    def close(self):
+        """End the page's read snapshot"""
+        if self.snapshot is not None:
+            SQLStorage.close_snapshot(self.snapshot)
+            self.snapshot = None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SQLStorage(ABC):
+    """Ratings kept in an embedded SQL database instead of a dataframe
+
+    Filters become WHERE clauses on indexed columns and the groupings behind
+    the summaries become GROUP BY queries returning counts, sums and score
+    histograms, so only aggregates and the requested rows come back into
+    Python. The dataset therefore doesn't have to fit in memory, and ratings
+    appended through the API are committed to disk.
+    """
+
+    name = None
+    # Type of the row id column, which must number new rows in insertion order
+    ID_COLUMN = None
+    # LIMIT clause meaning "no limit", for an OFFSET without a LIMIT
+    NO_LIMIT = ''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.create_schema()
+
+    @abstractmethod
+    def connect(self):
+        """New connection to the database"""
+
+    def connection(self):
+        """This thread's connection to the database"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connect()
+        return connection
+
+    def query(self, sql, params=(), connection=None):
+        return (connection or self.connection()).execute(sql, list(params)).fetchall()
+
+    def open_snapshot(self):
+        """Connection of its own whose queries all see the database as of the first one
+
+        Commits of other connections, such as a reload replacing the imported
+        rows, stay invisible to it until it is passed to close_snapshot.
+        """
+        connection = self.connect()
+        connection.execute('BEGIN TRANSACTION')
+        return connection
+
+    @staticmethod
+    def close_snapshot(connection):
+        connection.execute('ROLLBACK')
+        connection.close()
+
+    def create_schema(self):
+        columns = ', '.join(f'{_quote(column)} {kind}' for column, kind in COLUMNS.items())
+        statements = self.schema_statements() + [
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ("id" {self.ID_COLUMN}, "source" TEXT, {columns})',
+            'CREATE TABLE IF NOT EXISTS dataset_meta ("key" TEXT PRIMARY KEY, "value" TEXT)',
+        ]
+        connection = self.connection()
+        for statement in statements:
+            connection.execute(statement)
+        self.add_missing_columns()
+        for column in FILTER_COLUMNS.values():
+            self.create_index(f'{TABLE}_{column}', f'lower({_quote(column)})')
+        self.create_index(f'{TABLE}_source', '"source"')
+
+    def schema_statements(self):
+        return []
+
+    def add_missing_columns(self):
+        """Bring a database created by an older version up to COLUMNS
+
+        New columns are derived, so the data file is imported again and the
+        day codes of appended ratings are filled in from their timestamps.
+        """
+        existing = {row[1] for row in self.query(f'PRAGMA table_info({TABLE})')}
+        missing = [column for column in COLUMNS if column not in existing]
+        if not missing:
+            return
+
+        def migrate(connection):
+            for column in missing:
+                connection.execute(f'ALTER TABLE {TABLE} ADD COLUMN {_quote(column)} {COLUMNS[column]}')
+            connection.execute('DELETE FROM dataset_meta WHERE "key" = ?', ['source'])
+            if 'day_code' in missing:
+                rows = connection.execute(f'SELECT "id", "timestamp" FROM {TABLE}').fetchall()
+                if rows:
+                    ids, timestamps = zip(*rows)
+                    codes = day_codes(pd.to_datetime(pd.Series(timestamps), errors='coerce'))
+                    connection.executemany(
+                        f'UPDATE {TABLE} SET "day_code" = ? WHERE "id" = ?',
+                        list(zip(codes.tolist(), ids))
+                    )
+
+        self.write([migrate])
+        print(f"Storage schema updated: added {', '.join(missing)}")
+
+    def create_index(self, name, expression):
+        self.connection().execute(f'CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({expression})')
+
+    # ========== WRITING ==========
+
+    def write(self, batches):
+        """Run callables against the connection in one transaction"""
+        connection = self.connection()
+        with self._write_lock:
+            connection.execute('BEGIN TRANSACTION')
+            try:
+                for batch in batches:
+                    batch(connection)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def insert(self, connection, frame, source):
+        """Insert prepared rows tagged with their source"""
+        names = ', '.join(['"source"'] + [_quote(column) for column in COLUMNS])
+        placeholders = ', '.join(['?'] * (len(COLUMNS) + 1))
+        connection.executemany(
+            f'INSERT INTO {TABLE} ({names}) VALUES ({placeholders})',
+            [(source,) + row for row in _python_rows(frame)]
+        )
+
+    def append(self, frame, meta=None):
+        """Durably add rows that arrived through the ratings API, with metadata updated in the same transaction"""
+        self.write([lambda connection: self.insert(connection, frame, SOURCE_API)] + [
+            lambda connection, key=key, value=value: self.put_meta(connection, key, value)
+            for key, value in (meta or {}).items()
+        ])
+        return len(frame)
+
+    def replace_source(self, frames, signature):
+        """Swap the rows imported from the data file for new ones, keeping appended ratings
+
+        Readers keep seeing the old rows until the transaction commits.
+        """
+        rows = 0
+
+        def clear(connection):
+            connection.execute(f'DELETE FROM {TABLE} WHERE "source" = ?', [SOURCE_FILE])
+
+        def insert(frame):
+            def run(connection):
+                nonlocal rows
+                self.insert(connection, frame, SOURCE_FILE)
+                rows += len(frame)
+            return run
+
+        def record(connection):
+            self.put_meta(connection, 'source', signature)
+
+        # Frames are inserted as they arrive rather than collected first
+        self.write(itertools.chain([clear], (insert(frame) for frame in frames), [record]))
+        return rows
+
+    # ========== SOURCE TRACKING ==========
+
+    def meta(self, key):
+        """JSON value stored under key in dataset_meta, or None"""
+        rows = self.query('SELECT "value" FROM dataset_meta WHERE "key" = ?', [key])
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_meta(self, key, value):
+        self.write([lambda connection: self.put_meta(connection, key, value)])
+
+    @staticmethod
+    def put_meta(connection, key, value):
+        connection.execute('DELETE FROM dataset_meta WHERE "key" = ?', [key])
+        connection.execute('INSERT INTO dataset_meta VALUES (?, ?)', [key, json.dumps(value)])
+
+    def source_signature(self):
+        return self.meta('source')
+
+    def is_current(self, data_path):
+        """Whether the imported rows came from the current data file"""
+        source = self.source_signature()
+        if not source:
+            return False
+        current = file_signature(data_path)
+        if current['mtime_ns'] == source['mtime_ns'] and current['size'] == source['size']:
+            return True
+        # Touched or copied files are only re-imported if their content changed
+        return current['size'] == source['size'] and \
+            file_signature(data_path, with_hash=True)['sha1'] == source['sha1']
+
+    # ========== QUERIES ==========
+
+    @staticmethod
+    def where(filters, clauses=()):
+        """WHERE clause and parameters for the filters plus (clause, params) pairs"""
+        conditions, params = [], []
+        for clause, clause_params in clauses:
+            conditions.append(clause)
+            params.extend(clause_params)
+
+        filters = filters or {}
+        for key, column in FILTER_COLUMNS.items():
+            value = filters.get(key)
+            if value:
+                conditions.append(f'lower({_quote(column)}) = ?')
+                params.append(value.lower())
+
+        score_range = parse_score_range(filters.get('score_range'))
+        if score_range is not None:
+            conditions.append(f'{_SCORE} BETWEEN ? AND ?')
+            params.extend(score_range)
+
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def count(self, filters=None, connection=None):
+        where, params = self.where(filters)
+        return int(self.query(f'SELECT COUNT(*) FROM {TABLE}{where}', params, connection)[0][0])
+
+    def distinct(self, column):
+        """Sorted distinct non-missing values of a column"""
+        if column not in COLUMNS:
+            return []
+        rows = self.query(f'SELECT DISTINCT {_quote(column)} FROM {TABLE} WHERE {_quote(column)} IS NOT NULL')
+        return sorted(str(value) for value, in rows)
+
+    def summarize(self, filters=None, dimensions=AggregateCube.DIMENSIONS):
+        """Totals and group statistics for the rows matching the filters, aggregated in the database"""
+        where, params = self.where(filters)
+        row = self.query(f'SELECT {_STATS_SQL}, MIN("timestamp"), MAX("timestamp") FROM {TABLE}{where}', params)[0]
+        rows, count, total, sumsq = row[:4]
+        hist = np.array([value or 0 for value in row[6:6 + len(SCORE_VALUES)]], dtype=np.int64)
+        totals = {
+            'rows': int(rows),
+            'count': int(count),
+            'sum': float(total or 0),
+            'sumsq': float(sumsq or 0),
+            'hist': hist,
+            'null_scores': int(rows - count),
+            'start': pd.Timestamp(row[-2]) if row[-2] is not None else pd.NaT,
+            'end': pd.Timestamp(row[-1]) if row[-1] is not None else pd.NaT,
+        }
+
+        groups = {}
+        for dimension in dimensions:
+            column = _quote(dimension)
+            group_where, group_params = self.where(filters, [(f'{column} IS NOT NULL', [])])
+            groups[dimension] = self.group_stats(
+                dimension,
+                self.query(f'SELECT {column}, {_STATS_SQL} FROM {TABLE}{group_where} GROUP BY {column}', group_params)
+            )
+        return AggregateSummary(totals, groups)
+
+    @staticmethod
+    def group_stats(dimension, rows):
+        """Group statistics frame, laid out like the cube's, from GROUP BY result rows"""
+        stats = pd.DataFrame(
+            rows, columns=[dimension] + STAT_COLUMNS + HIST_COLUMNS
+        ).set_index(dimension)
+        stats.index = stats.index.astype(str)
+        for column in ['rows', 'count'] + HIST_COLUMNS:
+            stats[column] = stats[column].fillna(0).astype(np.int64)
+        for column in ['sum', 'sumsq']:
+            stats[column] = stats[column].fillna(0).astype(float)
+        for column in ['min', 'max']:
+            stats[column] = pd.to_numeric(stats[column]).astype(float)
+        return finalize_stats(stats.sort_index())
+
+    def daily_stats(self, filters=None, column=None):
+        """Number and sum of scores per (group, day) pair of the matching rows, grouped in the database
+
+        Returns arrays of days, group codes, counts and sums, and the group labels.
+        """
+        group = _quote(column) if column is not None else "'All'"
+        where, params = self.where(filters, [
+            ('"day_code" != ?', [int(MISSING_DAY)]),
+            (f'{_SCORE} IS NOT NULL', []),
+            (f'{group} IS NOT NULL', []),
+        ])
+        rows = self.query(
+            f'SELECT "day_code", {group}, COUNT(*), SUM({_SCORE}) FROM {TABLE}{where} GROUP BY "day_code", {group}',
+            params
+        )
+        labels = sorted({str(label) for _, label, _, _ in rows})
+        codes = {label: code for code, label in enumerate(labels)}
+        return (
+            np.array([day for day, _, _, _ in rows], dtype=np.int64),
+            np.array([codes[str(label)] for _, label, _, _ in rows], dtype=np.int64),
+            np.array([count for _, _, count, _ in rows], dtype=np.int64),
+            np.array([total for _, _, _, total in rows], dtype=float),
+            labels
+        )
+
+    def select_page(self, filters=None, offset=0, limit=None, cursor=None):
+        """One page of matching row ids, the total number of matches and the next cursor
+
+        Both are read in a snapshot the page keeps for iter_frames, so rows
+        replaced by a reload meanwhile are still the ones streamed.
+        """
+        snapshot = self.open_snapshot()
+        try:
+            total, ids = self._select_ids(snapshot, filters, offset, limit, cursor)
+        except BaseException:
+            self.close_snapshot(snapshot)
+            raise
+
+        next_cursor = None
+        if limit is not None and len(ids) > limit:
+            ids = ids[:limit]
+            next_cursor = int(ids[-1]) if limit else None
+        return StoragePage(ids, filters, snapshot), total, next_cursor
+
+    def _select_ids(self, connection, filters, offset, limit, cursor):
+        total = self.count(filters, connection)
+        where, params = self.where(filters, [('"id" > ?', [cursor])] if cursor is not None else [])
+
+        sql = f'SELECT "id" FROM {TABLE}{where} ORDER BY "id"'
+        if limit is not None:
+            # One extra row tells whether another page follows
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
+        elif offset:
+            sql += self.NO_LIMIT
+        if offset:
+            sql += ' OFFSET ?'
+            params.append(offset)
+
+        ids = np.array([row_id for row_id, in self.query(sql, params, connection)], dtype=np.int64)
+        return total, ids
+
+    def iter_frames(self, page, fields, chunk_size=5000):
+        """Yield the rows of a page as frames of at most chunk_size rows, from the snapshot the page was selected in"""
+        select = ', '.join(_quote(field) for field in fields)
+        connection = page.snapshot or self.connection()
+        try:
+            for start in range(0, len(page), chunk_size):
+                ids = page.ids[start:start + chunk_size]
+                # The page holds consecutive matches, so the filters within its id range select exactly it
+                where, params = self.where(page.filters, [('"id" BETWEEN ? AND ?', [int(ids[0]), int(ids[-1])])])
+                rows = self.query(f'SELECT {select} FROM {TABLE}{where} ORDER BY "id"', params, connection)
+                yield self.to_frame(rows, fields)
+        finally:
+            page.close()
+
+    def iter_by_time(self, fields, chunk_size=100000):
+        """Yield every row as frames of at most chunk_size rows, oldest timestamp first"""
+        select = ', '.join(_quote(field) for field in fields)
+        cursor = self.connection().execute(f'SELECT {select} FROM {TABLE} ORDER BY "timestamp", "id"')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield self.to_frame(rows, fields)
+
+    def read_frame(self, filters=None):
+        """All rows matching the filters as one dataframe"""
+        where, params = self.where(filters)
+        select = ', '.join(_quote(column) for column in COLUMNS)
+        return self.to_frame(self.query(f'SELECT {select} FROM {TABLE}{where} ORDER BY "id"', params), list(COLUMNS))
+
+    @staticmethod
+    def to_frame(rows, fields):
+        """Result rows as a dataframe with the loaded column types"""
+        frame = pd.DataFrame(rows, columns=fields)
+        for field in fields:
+            if field == 'timestamp':
+                frame[field] = pd.to_datetime(frame[field], errors='coerce')
+            elif field in INTEGER_COLUMNS:
+                frame[field] = pd.to_numeric(frame[field]).astype('Int64')
+            elif field == 'satisfaction_score':
+                frame[field] = pd.to_numeric(frame[field]).astype(float)
+        return frame
+
+
+class SQLiteStorage(SQLStorage):
+    """Storage in a SQLite database file, using expression indexes for the filters"""
+
+    name = 'sqlite'
+    ID_COLUMN = 'INTEGER PRIMARY KEY'
+    NO_LIMIT = ' LIMIT -1'
+
+    def connect(self):
+        # Transactions are managed explicitly by write()
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        # Readers keep working against the last commit while a reload writes
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+
+class DuckDBStorage(SQLStorage):
+    """Storage in a DuckDB database file, whose columnar scans make unindexed groupings cheap"""
+
+    name = 'duckdb'
+    ID_COLUMN = "BIGINT PRIMARY KEY DEFAULT nextval('ratings_id')"
+
+    def __init__(self, path):
+        self._database = duckdb.connect(path)
+        super().__init__(path)
+
+    def connect(self):
+        # Cursors of one database connection can be used from separate threads
+        return self._database.cursor()
+
+    def schema_statements(self):
+        return ['CREATE SEQUENCE IF NOT EXISTS ratings_id']
+
+    def create_index(self, name, expression):
+        try:
+            super().create_index(name, expression)
+        except duckdb.Error:
+            # Older releases can't index expressions; scans are fast enough without
+            pass
+
+    def insert(self, connection, frame, source):
+        """Insert prepared rows in bulk from a registered dataframe"""
+        rows = pd.DataFrame(_python_rows(frame), columns=list(COLUMNS), dtype=object)
+        names = ', '.join(_quote(column) for column in COLUMNS)
+        connection.register('incoming_rows', rows)
+        try:
+            connection.execute(
+                f'INSERT INTO {TABLE} ("source", {names}) SELECT ?, {names} FROM incoming_rows', [source]
+            )
+        finally:
+            connection.unregister('incoming_rows')
+
+
+# Storage backend name -> class
+STORAGE_BACKENDS = {'sqlite': SQLiteStorage, 'duckdb': DuckDBStorage}
+
+
+def open_storage(backend, path):
+    """Open a storage backend by name; 'auto' picks DuckDB when it is installed, else SQLite"""
+    if backend == 'auto':
+        backend = 'duckdb' if duckdb is not None else 'sqlite'
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"storage backend must be one of auto, {', '.join(STORAGE_BACKENDS)}")
+    if backend == 'duckdb' and duckdb is None:
+        print("DuckDB is not installed, using SQLite storage")
+        backend = 'sqlite'
+    return STORAGE_BACKENDS[backend](path)
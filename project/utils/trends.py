@@ -0,0 +1,120 @@
+import numpy as np
+
+# Period lengths offered for trends
+GRANULARITIES = ('day', 'week', 'month', 'semester')
+
+# Day code of rows without a timestamp
+MISSING_DAY = np.iinfo(np.int32).min
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def day_codes(timestamps):
+    """Days since 1970-01-01 of a column of timestamps, as int32 with MISSING_DAY where missing
+
+    Computed once when rows are loaded; every coarser period code is integer
+    arithmetic on these, so trends never format or parse dates per row.
+    """
+    values = timestamps.to_numpy(dtype='datetime64[ns]')
+    days = values.astype('datetime64[D]').astype(np.int64)
+    days[np.isnat(values)] = MISSING_DAY
+    return days.astype(np.int32)
+
+
+def period_codes(days, granularity):
+    """Period codes of day codes: days, Monday-based weeks, months or half-year semesters since 1970"""
+    days = np.asarray(days, dtype=np.int64)
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday, so week 0 starts on Monday 1969-12-29
+        return (days + 3) // 7
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if granularity == 'month':
+        return months
+    return months // 6
+
+
+def period_labels(first, count, granularity):
+    """Labels of count consecutive periods starting at code first
+
+    Days and weeks are labelled by their (first) date, months as 'YYYY-MM' and
+    semesters as 'YYYY-Spring' (January to June) or 'YYYY-Fall'.
+    """
+    codes = np.arange(first, first + count)
+    if granularity == 'day':
+        return np.datetime_as_string(EPOCH + codes, unit='D').tolist()
+    if granularity == 'week':
+        return np.datetime_as_string(EPOCH + codes * 7 - 3, unit='D').tolist()
+    if granularity == 'month':
+        return [f'{1970 + code // 12:04d}-{code % 12 + 1:02d}' for code in codes]
+    return [f"{1970 + code // 2:04d}-{'Spring' if code % 2 == 0 else 'Fall'}" for code in codes]
+
+
+def daily_stats(days, groups, scores):
+    """Number and sum of scores per (group, day) pair, skipping rows without a day, group or score
+
+    Returns parallel arrays of days, groups, counts and sums for the occupied pairs.
+    """
+    keep = (days != MISSING_DAY) & (groups >= 0) & ~np.isnan(scores)
+    days, groups, scores = days[keep].astype(np.int64), groups[keep].astype(np.int64), scores[keep]
+    if not len(days):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, np.zeros(0)
+
+    # Pairs are counted on a dense (group, day) grid, which stays small next to the rows
+    first = days.min()
+    span = days.max() - first + 1
+    key = groups * span + (days - first)
+    counts = np.bincount(key)
+    sums = np.bincount(key, weights=scores)
+    occupied = np.flatnonzero(counts)
+    groups, offsets = np.divmod(occupied, span)
+    return offsets + first, groups, counts[occupied], sums[occupied]
+
+
+def rolling_means(sums, counts, window):
+    """Mean score over each period and the window - 1 periods before it, along the last axis"""
+    sums = np.cumsum(sums, axis=-1)
+    counts = np.cumsum(counts, axis=-1)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    counts[..., window:] = counts[..., window:] - counts[..., :-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def build_trends(days, groups, counts, sums, group_labels, granularity, window=None):
+    """Dense per-group series of mean scores per period from (day, group) statistics
+
+    Every period between the first and the last one is listed, so the series
+    line up with the labels; periods without ratings have a count of 0 and a
+    null score.
+    """
+    result = {'granularity': granularity, 'window': window, 'labels': [], 'series': []}
+    if not len(days):
+        return result
+
+    periods = period_codes(days, granularity)
+    first = int(periods.min())
+    span = int(periods.max()) - first + 1
+    size = len(group_labels)
+    key = np.asarray(groups, dtype=np.int64) * span + (periods - first)
+    period_counts = np.bincount(key, weights=counts, minlength=size * span).reshape(size, span)
+    period_sums = np.bincount(key, weights=sums, minlength=size * span).reshape(size, span)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(period_counts > 0, period_sums / period_counts, np.nan)
+    rolling = rolling_means(period_sums, period_counts, window) if window else None
+
+    result['labels'] = period_labels(first, span, granularity)
+    for position in sorted(range(size), key=lambda position: group_labels[position]):
+        label = group_labels[position]
+        if not period_counts[position].any():
+            continue
+        series = {
+            'name': label,
+            'counts': period_counts[position].astype(np.int64).tolist(),
+            'scores': means[position].round(2).tolist(),
+        }
+        if rolling is not None:
+            series['rolling'] = rolling[position].round(2).tolist()
+        result['series'].append(series)
+    return result